@@ -0,0 +1,46 @@
+# bench/compare.py
+"""Print the difference between two bench/run.py reports:  python bench/compare.py old.json new.json"""
+import sys
+import json
+
+
+def _delta(old, new) -> str:
+    if old in (None, 0) or new is None:
+        return ""
+    pct = (new - old) / old * 100
+    return f"{pct:+.1f}%"
+
+
+def main(old_path: str, new_path: str):
+    with open(old_path) as fh:
+        old = json.load(fh)
+    with open(new_path) as fh:
+        new = json.load(fh)
+
+    print(f"{old['commit']} → {new['commit']}")
+    for name, cur in new["scenarios"].items():
+        prev = old["scenarios"].get(name)
+        if not prev:
+            print(f"\n{name}: (new scenario)")
+            continue
+
+        print(f"\n{name}")
+        rows = [
+            ("req/s", prev["rps"], cur["rps"]),
+            ("p50 ms", prev["latency_ms"]["p50"], cur["latency_ms"]["p50"]),
+            ("p95 ms", prev["latency_ms"]["p95"], cur["latency_ms"]["p95"]),
+            ("p99 ms", prev["latency_ms"]["p99"], cur["latency_ms"]["p99"]),
+            ("mongo ops/req", prev["mongo_ops_per_request"], cur["mongo_ops_per_request"]),
+            ("scoring drain s", prev.get("scoring_drain_s"), cur.get("scoring_drain_s")),
+        ]
+        for upstream, value in cur["outbound_per_request"].items():
+            rows.append((f"{upstream} calls/req", prev["outbound_per_request"].get(upstream), value))
+
+        for label, a, b in rows:
+            print(f"  {label:<22} {str(a):>10} → {str(b):<10} {_delta(a, b)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        raise SystemExit(__doc__)
+    main(sys.argv[1], sys.argv[2])
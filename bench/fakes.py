@@ -0,0 +1,256 @@
+# bench/fakes.py
+"""Local stand-ins for every upstream the backend talks to, plus Mongo round-trip counting."""
+import sys
+import json
+import types
+import base64
+import random
+import time
+import asyncio
+import hashlib
+import itertools
+
+import httpx
+
+ML_HOST = "ml.bench.local"
+ML_URI = f"http://{ML_HOST}/predict"
+ML_BATCH_URI = f"http://{ML_HOST}/predict/batch"
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+class FakeUpstreams:
+    """
+    One httpx transport serving the fake ML server, Google's token endpoint and the Gmail API.
+    Latencies are simulated with asyncio.sleep so the event loop behaves like it would in production.
+    """
+
+    def __init__(self, ml_latency_ms: float = 50, ml_jitter_ms: float = 20, ml_batch: bool = False,
+                 gmail_latency_ms: float = 30, new_mail_per_fetch: int = 10, backfill_pages: int = 3):
+        self.ml_latency = ml_latency_ms / 1000
+        self.ml_jitter = ml_jitter_ms / 1000
+        self.ml_batch = ml_batch
+        self.gmail_latency = gmail_latency_ms / 1000
+        self.new_mail_per_fetch = new_mail_per_fetch
+        self.backfill_pages = backfill_pages
+        self._ids = itertools.count(1)
+        self._history_id = 1000
+        self.calls = {"ml": 0, "ml_batch": 0, "oauth": 0, "gmail": 0, "gmail_batch": 0}
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if host == ML_HOST:
+            return await self._ml(request)
+        if host == "oauth2.googleapis.com":
+            self.calls["oauth"] += 1
+            await asyncio.sleep(self.gmail_latency)
+            return httpx.Response(200, json={"access_token": "bench-token", "expires_in": 3599})
+        if host == "gmail.googleapis.com":
+            self.calls["gmail"] += 1
+            await asyncio.sleep(self.gmail_latency)
+            return self._gmail(request)
+        return httpx.Response(404)
+
+    # ----------------------------
+    # ML
+    # ----------------------------
+    @staticmethod
+    def _score(text: str) -> dict:
+        score = int(hashlib.md5(text.encode()).hexdigest(), 16) % 101
+        return {
+            "score": score,
+            "confidence": 1 if score >= 75 else 0,
+            "reasoning": "bench",
+            "highlighted_text": "",
+            "final_decision": "Critical" if score >= 76 else "Secure",
+            "suggestion": "",
+        }
+
+    async def _ml(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content or b"{}")
+        await asyncio.sleep(max(0.0, self.ml_latency + random.uniform(-self.ml_jitter, self.ml_jitter)))
+
+        if request.url.path.endswith("/batch"):
+            if not self.ml_batch:
+                return httpx.Response(404)
+            self.calls["ml_batch"] += 1
+            return httpx.Response(200, json={"results": [self._score(t) for t in body["texts"]]})
+
+        self.calls["ml"] += 1
+        return httpx.Response(200, json=self._score(body.get("text", "")))
+
+    # ----------------------------
+    # Gmail
+    # ----------------------------
+    def _message(self, msg_id: str) -> dict:
+        n = int(msg_id[1:]) if msg_id[1:].isdigit() else 0
+        sender = f"sender{n % 50}@example.com"
+        text = f"Hello, this is bench message {n}. Visit https://example.com/{n % 7} for details."
+        return {
+            "id": msg_id,
+            "threadId": msg_id,
+            "historyId": str(1000 + n),
+            "internalDate": str(1700000000000 + n * 1000),
+            "snippet": text[:80],
+            "payload": {
+                "mimeType": "multipart/alternative",
+                "headers": [
+                    {"name": "From", "value": f"Sender {n % 50} <{sender}>"},
+                    {"name": "Subject", "value": f"Bench message {n}"},
+                ],
+                "parts": [
+                    {"mimeType": "text/plain", "body": {"size": len(text), "data": _b64(text)}},
+                    {"mimeType": "text/html", "body": {"size": len(text), "data": _b64(f"<p>{text}</p>")}},
+                ],
+            },
+        }
+
+    def _gmail_batch(self, request: httpx.Request) -> httpx.Response:
+        """Answer a multipart/mixed batch the way Google does: one application/http part per call."""
+        boundary = request.headers["Content-Type"].split("boundary=", 1)[1]
+        out = "batch_bench"
+        parts = []
+        for chunk in request.content.decode().split(f"--{boundary}")[1:]:
+            lines = chunk.strip().splitlines()
+            if not lines or lines[0] == "--":
+                continue
+            content_id = next((l.split(":", 1)[1].strip().strip("<>") for l in lines
+                               if l.lower().startswith("content-id:")), "")
+            target = next(l for l in lines if l.startswith("GET "))
+            msg_id = target.split()[1].split("?")[0].rsplit("/", 1)[-1]
+            parts.append(
+                f"--{out}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(self._message(msg_id), indent=2)}\r\n"
+            )
+        body = "".join(parts) + f"--{out}--\r\n"
+        return httpx.Response(200, content=body.encode(),
+                              headers={"Content-Type": f"multipart/mixed; boundary={out}"})
+
+    def _gmail(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.startswith("/batch/"):
+            self.calls["gmail_batch"] += 1
+            return self._gmail_batch(request)
+        if path.endswith("/profile"):
+            return httpx.Response(200, json={"emailAddress": "bench@gmail.com", "historyId": str(self._history_id)})
+        if path.endswith("/watch"):
+            expiration = int((time.time() + 7 * 86400) * 1000)
+            return httpx.Response(200, json={"historyId": str(self._history_id), "expiration": str(expiration)})
+        if path.endswith("/history"):
+            # every poll finds new_mail_per_fetch freshly delivered messages
+            ids = [f"m{next(self._ids)}" for _ in range(self.new_mail_per_fetch)]
+            self._history_id += 1
+            return httpx.Response(200, json={
+                "history": [{"id": str(self._history_id), "messagesAdded": [
+                    {"message": {"id": i, "threadId": i, "labelIds": ["INBOX"]}} for i in ids
+                ]}],
+                "historyId": str(self._history_id),
+            })
+        if path.endswith("/messages"):
+            count = min(int(request.url.params.get("maxResults", 10)), self.new_mail_per_fetch)
+            ids = [f"m{next(self._ids)}" for _ in range(count)]
+            body = {"messages": [{"id": i, "threadId": i} for i in ids]}
+            # backfill searches (q=newer_than:Nd) span backfill_pages pages
+            page = int(request.url.params.get("pageToken", "p0")[1:])
+            if "q" in request.url.params and page + 1 < self.backfill_pages:
+                body["nextPageToken"] = f"p{page + 1}"
+            return httpx.Response(200, json=body)
+        if "/messages/" in path:
+            return httpx.Response(200, json=self._message(path.rsplit("/", 1)[-1]))
+        return httpx.Response(404)
+
+
+def push_envelope(gmail_email: str, history_id: int) -> dict:
+    """What a Pub/Sub push subscription POSTs for one Gmail watch notification."""
+    data = json.dumps({"emailAddress": gmail_email, "historyId": history_id}).encode()
+    return {
+        "message": {"data": base64.b64encode(data).decode(), "messageId": str(history_id)},
+        "subscription": "projects/bench/subscriptions/gmail-push",
+    }
+
+
+# ----------------------------
+# FCM
+# ----------------------------
+def install_fcm_stub() -> list:
+    """Replace fcm_service (which needs Firebase credentials) before the app imports it."""
+    sent = []
+    module = types.ModuleType("fcm_service")
+
+    def send_fcm_notification(token: str = None, title: str = "AegisSecure", body: str = "", data: dict = None):
+        sent.append(token)
+        return {"success": True, "id": f"bench-{len(sent)}"}
+
+    module.send_fcm_notification = send_fcm_notification
+    sys.modules["fcm_service"] = module
+    return sent
+
+
+# ----------------------------
+# Mongo
+# ----------------------------
+class MongoCounter:
+    total = 0
+
+
+def install_mongo(uri: str) -> MongoCounter:
+    """
+    Count Mongo round trips. A real mongod (uri="mongodb://...") is counted with pymongo
+    command monitoring; uri="memory" swaps in mongomock-motor and counts collection calls.
+    Must run before `database` is imported.
+    """
+    counter = MongoCounter()
+
+    if uri != "memory":
+        from pymongo import monitoring
+
+        class _Listener(monitoring.CommandListener):
+            def started(self, event):
+                counter.total += 1
+
+            def succeeded(self, event):
+                pass
+
+            def failed(self, event):
+                pass
+
+        monitoring.register(_Listener())
+        return counter
+
+    try:
+        import mongomock_motor
+    except ImportError:
+        raise SystemExit("--mongo memory needs `pip install mongomock-motor` (or pass a mongodb:// URI)")
+
+    import motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+    # pymongo >= 4.9 passes sort= to bulk update builders; mongomock 4.x does not accept it
+    from mongomock.collection import BulkOperationBuilder
+    add_update = BulkOperationBuilder.add_update
+
+    def add_update_compat(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    BulkOperationBuilder.add_update = add_update_compat
+
+    col_cls = mongomock_motor.AsyncMongoMockCollection
+    for name in ("find_one", "find", "insert_one", "insert_many", "update_one", "update_many",
+                 "delete_one", "delete_many", "aggregate", "find_one_and_update", "bulk_write",
+                 "count_documents", "replace_one"):
+        original = getattr(col_cls, name, None)
+        if original is None:
+            continue
+
+        def counted(self, *args, __original=original, **kwargs):
+            counter.total += 1
+            return __original(self, *args, **kwargs)
+
+        setattr(col_cls, name, counted)
+    return counter
@@ -0,0 +1,269 @@
+# bench/run.py
+"""
+Offline benchmark for the ingestion hot paths.
+
+Boots the FastAPI app in-process (lifespan included) with every upstream replaced
+by local fakes (bench/fakes.py), drives concurrent load and writes a JSON report:
+
+    python bench/run.py --mongo memory                       # needs mongomock-motor
+    python bench/run.py --mongo mongodb://localhost:27017    # local mongod, exact round-trip counts
+
+The dashboard scenario needs a real mongod: mongomock does not implement $convert.
+    python bench/run.py --scenarios sms_save --requests 2000 --concurrency 64 --ml-latency-ms 80
+
+Compare two runs with:  python bench/compare.py old.json new.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+
+SCENARIOS = ("sms_save", "gmail_fetch", "gmail_push", "dashboard")
+BENCH_SECRET = "bench-secret-0123456789abcdef0123456789"
+
+TEMPLATES = [
+    "Your OTP for login is 482913. Do not share it with anyone.",
+    "Rs 2,500.00 debited from A/c XX1234 on 12-Oct. Not you? Call 1800-000-000.",
+    "Your parcel is out for delivery today. Track at https://track.example.com/abc",
+    "Congratulations! You have won a prize. Claim now at http://bit.ly/claim-prize",
+]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--scenarios", default=",".join(SCENARIOS))
+    p.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--mongo", default="memory", help='"memory" or a mongodb:// URI of a scratch mongod')
+    p.add_argument("--ml-latency-ms", type=float, default=50)
+    p.add_argument("--ml-jitter-ms", type=float, default=20)
+    p.add_argument("--ml-batch", action="store_true", help="fake ML server accepts batched requests")
+    p.add_argument("--gmail-latency-ms", type=float, default=30)
+    p.add_argument("--templated-ratio", type=float, default=0.7, help="share of SMS bodies reused across users")
+    p.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for the scoring queue")
+    p.add_argument("--out", default=None, help="report path (default bench/results/<time>-<commit>.json)")
+    return p.parse_args()
+
+
+def configure_env(args):
+    """Everything the app reads at import time must be set before it is imported."""
+    os.environ["CYBER_SECURE_API_URI"] = fakes.ML_URI
+    os.environ["CYBER_SECURE_BATCH_API_URI"] = fakes.ML_BATCH_URI
+    os.environ["JWT_SECRET"] = BENCH_SECRET
+    os.environ["GOOGLE_CLIENT_ID"] = "bench-client"
+    os.environ["GOOGLE_CLIENT_SECRET"] = BENCH_SECRET
+    os.environ["GOOGLE_REDIRECT_URI"] = "http://bench.local/auth/google/callback"
+    os.environ["GROQ_API_KEY"] = "bench"
+    os.environ["GMAIL_PUSH_TOKEN"] = BENCH_SECRET
+    os.environ.setdefault("GMAIL_PUSH_DEBOUNCE_SECONDS", "0.2")
+    if args.mongo != "memory":
+        os.environ["MONGO_URI"] = args.mongo
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def percentile(values: list, p: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class _FakeGroq:
+    """Dashboard insights call Groq synchronously; answer instantly instead."""
+
+    class _Completions:
+        @staticmethod
+        def create(**kwargs):
+            msg = type("Msg", (), {"content": '{"fact1": "Use MFA.", "fact2": "Check links."}'})
+            return type("Resp", (), {"choices": [type("Choice", (), {"message": msg})]})
+
+    chat = type("Chat", (), {"completions": _Completions})
+
+
+async def seed(user_email: str):
+    from bson import ObjectId
+    from database import users_col, accounts_col, sms_messages_col, messages_col
+
+    user_id = ObjectId()
+    await users_col.insert_one({
+        "_id": user_id, "name": "Bench", "email": user_email, "password": "x",
+        "verified": True, "fcm_tokens": ["bench-device"], "notification_pref": "all",
+    })
+    await accounts_col.insert_one({
+        "user_id": str(user_id), "gmail_email": "bench@gmail.com", "refresh_token": "bench-refresh",
+    })
+
+    # history for the dashboard aggregations
+    await sms_messages_col.insert_many([
+        {"user_id": str(user_id), "address": f"AX-BANK{i % 20}", "body": "seed", "date_ms": i,
+         "type": "inbox", "spam_score": i % 101, "verdict_status": "scored"}
+        for i in range(2000)
+    ])
+    await messages_col.insert_many([
+        {"user_id": str(user_id), "gmail_id": f"seed{i}", "gmail_email": "bench@gmail.com",
+         "from_email": f"s{i % 30}@example.com", "body": "seed", "timestamp": 1700000000000 + i,
+         "spam_score": (i * 7) % 101, "verdict_status": "scored"}
+        for i in range(2000)
+    ])
+    return str(user_id)
+
+
+def make_request(scenario: str, n: int, args) -> tuple:
+    if scenario == "sms_save":
+        if n % 100 < args.templated_ratio * 100:
+            body = TEMPLATES[n % len(TEMPLATES)]
+        else:
+            body = f"Hi, unique message number {n} from the bench run."
+        payload = {"address": f"AX-SNDR{n % 40}", "body": body, "date_ms": 1700000000000 + n, "type": "inbox"}
+        return "POST", "/sms/save", payload
+    if scenario == "gmail_fetch":
+        return "POST", "/gmail/gmail/fetch-latest", {"gmail_email": "bench@gmail.com"}
+    if scenario == "gmail_push":
+        # a burst of notifications for one mailbox; the debouncer should turn it into a few syncs
+        return "POST", f"/gmail/push?token={BENCH_SECRET}", fakes.push_envelope("bench@gmail.com", 2000 + n)
+    if scenario == "dashboard":
+        return "GET", "/dashboard", None
+    raise ValueError(scenario)
+
+
+async def wait_for_queue_drain(timeout: float) -> float:
+    from database import scoring_jobs_col
+
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if await scoring_jobs_col.count_documents({"status": {"$in": ["queued", "leased"]}}) == 0:
+            return time.perf_counter() - started
+        await asyncio.sleep(0.05)
+    return None
+
+
+async def run_scenario(client, scenario: str, args, token: str, upstreams, mongo) -> dict:
+    import http_client
+
+    def outbound() -> dict:
+        return {name: s["counters"].get("requests", 0) for name, s in http_client.pool_stats().items()}
+
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies, statuses = [], {}
+    mongo_before, outbound_before = mongo.total, outbound()
+    counter = iter(range(args.requests))
+    # keep SMS keys unique across scenarios/runs within this process
+    offset = int(time.time() * 1000)
+
+    async def worker():
+        for n in counter:
+            method, path, body = make_request(scenario, n + offset, args)
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, json=body, headers=headers)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    duration = time.perf_counter() - started
+
+    if scenario == "gmail_push":
+        import gmail_push
+        while gmail_push.pending_syncs():
+            await asyncio.sleep(0.05)
+
+    # Requests only enqueue scoring; include the time for the background pipeline to catch up
+    drain = await wait_for_queue_drain(args.drain_timeout) if scenario != "dashboard" else 0.0
+
+    n = len(latencies)
+    outbound_after = outbound()
+    return {
+        "requests": n,
+        "concurrency": args.concurrency,
+        "duration_s": round(duration, 3),
+        "rps": round(n / duration, 1) if duration else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(sum(latencies) / n, 2),
+            "max": round(max(latencies), 2),
+        },
+        "status_codes": {str(k): v for k, v in statuses.items()},
+        "scoring_drain_s": round(drain, 3) if drain is not None else None,
+        # includes the background scoring work triggered by the requests
+        "mongo_ops_per_request": round((mongo.total - mongo_before) / n, 2),
+        "outbound_per_request": {
+            name: round((outbound_after[name] - outbound_before[name]) / n, 3) for name in outbound_after
+        },
+    }
+
+
+async def main():
+    args = parse_args()
+    configure_env(args)
+
+    fakes.install_fcm_stub()
+    mongo = fakes.install_mongo(args.mongo)
+
+    upstreams = fakes.FakeUpstreams(
+        ml_latency_ms=args.ml_latency_ms, ml_jitter_ms=args.ml_jitter_ms, ml_batch=args.ml_batch,
+        gmail_latency_ms=args.gmail_latency_ms,
+    )
+
+    import httpx
+    import jwt
+    import http_client
+    http_client.use_transport(upstreams.transport())
+
+    import main as app_module
+    from routes import dashboard
+    dashboard.client = _FakeGroq()
+
+    user_email = f"bench-{int(time.time())}@example.com"
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "config": vars(args),
+        "scenarios": {},
+    }
+
+    async with app_module.lifespan(app_module.app):
+        await seed(user_email)
+        token = jwt.encode({"email": user_email}, BENCH_SECRET, algorithm="HS256")
+
+        # app errors come back as 500s and are counted, instead of aborting the run
+        transport = httpx.ASGITransport(app=app_module.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench.local", timeout=None) as client:
+            for scenario in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+                if scenario == "dashboard" and args.mongo == "memory":
+                    print("⚠ Skipping dashboard: its aggregation needs a real mongod (--mongo mongodb://...)")
+                    continue
+                print(f"▶ {scenario}: {args.requests} requests @ concurrency {args.concurrency}")
+                result = await run_scenario(client, scenario, args, token, upstreams, mongo)
+                report["scenarios"][scenario] = result
+                print(f"  {result['rps']} req/s  p50={result['latency_ms']['p50']}ms "
+                      f"p95={result['latency_ms']['p95']}ms p99={result['latency_ms']['p99']}ms  "
+                      f"mongo/req={result['mongo_ops_per_request']}  outbound/req={result['outbound_per_request']}")
+
+    out = args.out or os.path.join(
+        ROOT, "bench", "results", f"{datetime.utcnow():%Y%m%d-%H%M%S}-{report['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump(report, fh, indent=2, default=str)
+    print(f"✅ Report written to {out}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
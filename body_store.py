@@ -0,0 +1,234 @@
+# body_store.py
+"""
+Large text fields (message bodies, ML reasoning / highlights) live zlib-compressed
+in a side collection keyed by the message _id, so list and dashboard queries only
+touch small documents. A message lists the fields moved out in `stored_fields`;
+detail endpoints put them back with load_fields().
+
+    python body_store.py migrate   # move existing inline fields out, print the savings
+    python body_store.py report    # collection sizes only
+"""
+import os
+import sys
+import zlib
+import asyncio
+
+from bson import Binary, ObjectId
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from database import messages_col, sms_messages_col, message_bodies_col, sms_bodies_col
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+# Shorter values stay inline: a typical SMS is not worth a second lookup
+BODY_STORE_MIN_BYTES = int(os.getenv("BODY_STORE_MIN_BYTES", "512"))
+BODY_STORE_ZLIB_LEVEL = int(os.getenv("BODY_STORE_ZLIB_LEVEL", "6"))
+BODY_STORE_MIGRATE_BATCH = int(os.getenv("BODY_STORE_MIGRATE_BATCH", "200"))
+
+STORED_FIELDS = ("body", "reasoning", "highlighted_text")
+
+# channel (as in scoring_queue) → (message collection, side collection)
+STORES = {
+    "sms": (sms_messages_col, sms_bodies_col),
+    "email": (messages_col, message_bodies_col),
+}
+
+_counters = {"stored": 0, "raw_bytes": 0, "stored_bytes": 0, "loaded": 0}
+
+
+def _split(fields: dict):
+    """(values kept inline, {field: compressed blob}, {field: raw size}) for one message."""
+    inline, blobs, sizes = {}, {}, {}
+    for name, value in fields.items():
+        raw = value.encode("utf-8") if name in STORED_FIELDS and isinstance(value, str) else None
+        if raw is None or len(raw) < BODY_STORE_MIN_BYTES:
+            inline[name] = value
+            continue
+        blobs[name] = Binary(zlib.compress(raw, BODY_STORE_ZLIB_LEVEL))
+        sizes[name] = len(raw)
+        _counters["stored"] += 1
+        _counters["raw_bytes"] += len(raw)
+        _counters["stored_bytes"] += len(blobs[name])
+    return inline, blobs, sizes
+
+
+def _store_op(doc_id, blobs: dict, sizes: dict) -> UpdateOne:
+    return UpdateOne(
+        {"_id": doc_id},
+        {"$set": {**blobs, **{f"raw_bytes.{name}": n for name, n in sizes.items()}}},
+        upsert=True
+    )
+
+
+# ----------------------------
+# Writes
+# ----------------------------
+async def offload_new(channel: str, docs: list) -> list:
+    """
+    Before inserting new messages: give each an _id, move its large fields to the
+    side collection and return the slimmed docs. Rows of docs that turn out to be
+    duplicates are removed again with discard().
+    """
+    _, side_col = STORES[channel]
+    slim, ops = [], []
+    for doc in docs:
+        doc.setdefault("_id", ObjectId())
+        inline, blobs, sizes = _split(doc)
+        inline["stored_fields"] = list(blobs)
+        if blobs:
+            ops.append(_store_op(doc["_id"], blobs, sizes))
+        slim.append(inline)
+
+    if ops:
+        await side_col.bulk_write(ops, ordered=False)
+    return slim
+
+
+async def discard(channel: str, doc_ids: list):
+    if doc_ids:
+        _, side_col = STORES[channel]
+        await side_col.delete_many({"_id": {"$in": doc_ids}})
+
+
+async def update_fields(channel: str, doc_id, fields: dict):
+    """$set on a stored message, with the large values going to the side collection."""
+    col, side_col = STORES[channel]
+    inline, blobs, sizes = _split(fields)
+    # stored fields now short enough to stay inline: the old blob must not be loaded over them
+    stale = [name for name in inline if name in STORED_FIELDS]
+
+    updates = [{"$set": inline}]
+    if stale:
+        updates[0]["$pull"] = {"stored_fields": {"$in": stale}}
+    if blobs:
+        await side_col.bulk_write([_store_op(doc_id, blobs, sizes)])
+        added = {"$addToSet": {"stored_fields": {"$each": list(blobs)}}}
+        # $pull and $addToSet on the same field cannot share one update
+        if stale:
+            updates.append(added)
+        else:
+            updates[0].update(added)
+    for update in updates:
+        await col.update_one({"_id": doc_id}, update)
+
+    if stale:
+        await side_col.update_one(
+            {"_id": doc_id},
+            {"$unset": {**{name: "" for name in stale}, **{f"raw_bytes.{name}": "" for name in stale}}}
+        )
+
+
+# ----------------------------
+# Reads
+# ----------------------------
+async def load_fields(channel: str, docs: list, fields: tuple = STORED_FIELDS) -> list:
+    """Put the stored values of `fields` back into `docs` (one $in lookup for the batch)."""
+    wanted = {}
+    for doc in docs:
+        names = [f for f in doc.pop("stored_fields", None) or [] if f in fields]
+        if names:
+            wanted[doc["_id"]] = (doc, names)
+    if not wanted:
+        return docs
+
+    _, side_col = STORES[channel]
+    projection = {name: 1 for name in fields}
+    async for row in side_col.find({"_id": {"$in": list(wanted)}}, projection):
+        doc, names = wanted[row["_id"]]
+        for name in names:
+            if name in row:
+                doc[name] = zlib.decompress(row[name]).decode("utf-8")
+                _counters["loaded"] += 1
+    return docs
+
+
+def body_store_stats() -> dict:
+    return {
+        **_counters,
+        "min_bytes": BODY_STORE_MIN_BYTES,
+        "ratio": round(_counters["stored_bytes"] / _counters["raw_bytes"], 3) if _counters["raw_bytes"] else None,
+    }
+
+
+# ----------------------------
+# Migration / report
+# ----------------------------
+async def _coll_size(col) -> dict:
+    try:
+        stats = await col.database.command("collStats", col.name)
+    except Exception:
+        return {}
+    return {"size": stats.get("size"), "storage_size": stats.get("storageSize"), "count": stats.get("count")}
+
+
+async def size_report() -> dict:
+    report = {}
+    for channel, (col, side_col) in STORES.items():
+        report[channel] = {col.name: await _coll_size(col), side_col.name: await _coll_size(side_col)}
+    return report
+
+
+async def migrate(batch_size: int = BODY_STORE_MIGRATE_BATCH) -> dict:
+    """Move inline fields of every not yet migrated message. Safe to re-run / resume."""
+    summary = {}
+    for channel, (col, side_col) in STORES.items():
+        totals = {"messages": 0, "fields_moved": 0, "raw_bytes": 0, "stored_bytes": 0}
+        while True:
+            batch = await col.find(
+                {"stored_fields": {"$exists": False}},
+                {name: 1 for name in STORED_FIELDS}
+            ).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+
+            store_ops, message_ops = [], []
+            for doc in batch:
+                _, blobs, sizes = _split({k: v for k, v in doc.items() if k != "_id"})
+                if blobs:
+                    store_ops.append(_store_op(doc["_id"], blobs, sizes))
+                update = {"$set": {"stored_fields": list(blobs)}}
+                if blobs:
+                    update["$unset"] = {name: "" for name in blobs}
+                # guard: a concurrent writer may have migrated it meanwhile
+                message_ops.append(UpdateOne({"_id": doc["_id"], "stored_fields": {"$exists": False}}, update))
+
+                totals["fields_moved"] += len(blobs)
+                totals["raw_bytes"] += sum(sizes.values())
+                totals["stored_bytes"] += sum(len(b) for b in blobs.values())
+
+            # side rows first: a crash in between leaves the inline copy in place
+            if store_ops:
+                await side_col.bulk_write(store_ops, ordered=False)
+            await col.bulk_write(message_ops, ordered=False)
+            totals["messages"] += len(batch)
+            print(f"… {channel}: {totals['messages']} messages migrated")
+
+        totals["saved_bytes"] = totals["raw_bytes"] - totals["stored_bytes"]
+        summary[channel] = totals
+    return summary
+
+
+async def _main(command: str) -> int:
+    if command == "migrate":
+        before = await size_report()
+        moved = await migrate()
+        after = await size_report()
+        for channel, totals in moved.items():
+            pct = 100 * totals["saved_bytes"] / totals["raw_bytes"] if totals["raw_bytes"] else 0
+            print(f"✅ {channel}: {totals['fields_moved']} fields from {totals['messages']} messages, "
+                  f"{totals['raw_bytes']} → {totals['stored_bytes']} bytes ({pct:.1f}% saved)")
+        print({"before": before, "after": after})
+        return 0
+    if command == "report":
+        print(await size_report())
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "")))
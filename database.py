@@ -14,5 +14,16 @@ users_col = auth_db.users
 accounts_col = mail_db.accounts
 messages_col = mail_db.messages
 otps_col=auth_db.otps
+fcm_tokens_col = auth_db.fcm_tokens
 avatars_col = mail_db.avatars 
 sms_messages_col = sms_db.sms_messages
+ml_db = client.Ml_db
+verdict_cache_col = ml_db.verdict_cache
+verdict_cache_state_col = ml_db.verdict_cache_state
+scoring_jobs_col = ml_db.scoring_jobs
+sender_reputation_col = ml_db.sender_reputation
+access_tokens_col = auth_db.access_tokens
+backfill_jobs_col = mail_db.backfill_jobs
+message_bodies_col = mail_db.message_bodies
+sms_bodies_col = sms_db.sms_bodies
+user_avatars_col = auth_db.user_avatars
@@ -0,0 +1,137 @@
+# gmail_backfill.py
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from database import backfill_jobs_col, accounts_col
+from gmail_client import gmail_get
+from gmail_sync import ingest_messages
+from lease_queue import LeaseQueue
+from token_manager import get_access_token, gmail_token_key
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+GMAIL_BACKFILL_DAYS = int(os.getenv("GMAIL_BACKFILL_DAYS", "30"))                 # history depth on link
+GMAIL_BACKFILL_MAX_MESSAGES = int(os.getenv("GMAIL_BACKFILL_MAX_MESSAGES", "2000"))
+GMAIL_BACKFILL_PAGE_SIZE = int(os.getenv("GMAIL_BACKFILL_PAGE_SIZE", "100"))
+GMAIL_BACKFILL_WORKERS = int(os.getenv("GMAIL_BACKFILL_WORKERS", "2"))
+GMAIL_BACKFILL_LEASE_SECONDS = int(os.getenv("GMAIL_BACKFILL_LEASE_SECONDS", "120"))
+GMAIL_BACKFILL_MAX_ATTEMPTS = int(os.getenv("GMAIL_BACKFILL_MAX_ATTEMPTS", "5"))
+GMAIL_BACKFILL_POLL_SECONDS = float(os.getenv("GMAIL_BACKFILL_POLL_SECONDS", "2"))
+
+# a killed worker resumes from the job's last page checkpoint once its lease expires
+_queue = LeaseQueue(
+    "Backfill job", backfill_jobs_col,
+    lease_seconds=GMAIL_BACKFILL_LEASE_SECONDS, poll_seconds=GMAIL_BACKFILL_POLL_SECONDS,
+)
+_counters = {"enqueued": 0, "pages": 0, "imported": 0, "completed": 0, "retried": 0, "failed": 0}
+
+
+# ----------------------------
+# Producer side
+# ----------------------------
+async def enqueue_backfill(user_id: str, gmail_email: str, days: int = GMAIL_BACKFILL_DAYS):
+    """One job per linked mailbox; linking again restarts it from the first page."""
+    now = datetime.utcnow()
+    await backfill_jobs_col.update_one(
+        {"user_id": user_id, "gmail_email": gmail_email},
+        {
+            "$set": {
+                "status": "queued",
+                "days": days,
+                "page_token": None,
+                "imported": 0,
+                "skipped": 0,
+                "attempts": 0,
+                "run_after": now,
+                "created_at": now,
+                "last_error": None,
+            },
+            "$unset": {"lease_owner": "", "lease_until": "", "finished_at": ""},
+        },
+        upsert=True
+    )
+    _counters["enqueued"] += 1
+    _queue.wake()
+
+
+# ----------------------------
+# Consumer side
+# ----------------------------
+async def _run_job(job: dict, worker_id: str):
+    account = await accounts_col.find_one({"user_id": job["user_id"], "gmail_email": job["gmail_email"]})
+    if not account or "refresh_token" not in account:
+        raise RuntimeError("Gmail account not linked")
+
+    token_key = gmail_token_key(job["user_id"], job["gmail_email"])
+    page_token = job.get("page_token")
+    imported = job.get("imported", 0)
+
+    while imported < GMAIL_BACKFILL_MAX_MESSAGES:
+        access_token = await get_access_token(token_key, account["refresh_token"])
+        params = {
+            "q": f"newer_than:{job['days']}d",
+            "maxResults": min(GMAIL_BACKFILL_PAGE_SIZE, GMAIL_BACKFILL_MAX_MESSAGES - imported),
+        }
+        if page_token:
+            params["pageToken"] = page_token
+
+        page = await gmail_get(access_token, "messages", job["gmail_email"], params=params)
+        msg_ids = [m["id"] for m in page.get("messages", []) if m.get("id")]
+        # old mail: scored, but no "New Risk Alert" push per message
+        result = await ingest_messages(access_token, job["user_id"], job["gmail_email"], msg_ids, notify=False)
+        if result["failed"]:
+            # keep the checkpoint on this page; the retry re-imports only what is missing
+            raise RuntimeError(f"{result['failed']} messages failed on this page")
+
+        page_token = page.get("nextPageToken")
+        imported += len(msg_ids)
+        _counters["pages"] += 1
+        _counters["imported"] += result["added"]
+
+        # checkpoint, while we still own the job
+        saved = await backfill_jobs_col.update_one(
+            _queue.guard(job, worker_id),
+            {
+                "$set": {"page_token": page_token, "imported": imported},
+                "$inc": {"skipped": result["skipped"]},
+            }
+        )
+        if not saved.matched_count:
+            return   # lease lost (or the mailbox was re-linked); someone else owns the job now
+        if not page_token:
+            break
+
+    _counters["completed"] += 1
+    await backfill_jobs_col.update_one(
+        _queue.guard(job, worker_id),
+        {"$set": {"status": "done", "finished_at": datetime.utcnow()},
+         "$unset": {"lease_owner": "", "lease_until": ""}}
+    )
+
+
+async def _retry_or_fail(job: dict, worker_id: str, error: str):
+    backoff = min(600, 10 * 2 ** job["attempts"])
+    if await _queue.retry_or_fail(job, worker_id, error, GMAIL_BACKFILL_MAX_ATTEMPTS, backoff):
+        _counters["failed"] += 1
+    else:
+        _counters["retried"] += 1
+
+
+async def start_backfill_workers(count: int = GMAIL_BACKFILL_WORKERS):
+    await _queue.start(count, _run_job, on_error=_retry_or_fail, suffix=":backfill")
+
+
+async def stop_backfill_workers():
+    await _queue.stop()
+
+
+# ----------------------------
+# Observability
+# ----------------------------
+async def backfill_stats() -> dict:
+    return {"depth": await _queue.depth(), "workers": len(_queue.workers), "counters": dict(_counters)}
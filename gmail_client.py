@@ -0,0 +1,234 @@
+# gmail_client.py
+import os
+import json as pyjson
+import random
+import asyncio
+import weakref
+from dotenv import load_dotenv
+
+from http_client import get_client
+
+load_dotenv()
+
+GMAIL_API = "https://gmail.googleapis.com/gmail/v1/users/me"
+
+# ----------------------------
+# Config
+# ----------------------------
+# Gmail enforces per-user quota, so concurrency is bounded per mailbox, not globally
+GMAIL_ACCOUNT_CONCURRENCY = int(os.getenv("GMAIL_ACCOUNT_CONCURRENCY", "5"))
+GMAIL_MAX_RETRIES = int(os.getenv("GMAIL_MAX_RETRIES", "5"))
+GMAIL_BACKOFF_BASE = float(os.getenv("GMAIL_BACKOFF_BASE", "0.5"))     # seconds
+GMAIL_BACKOFF_MAX = float(os.getenv("GMAIL_BACKOFF_MAX", "32"))
+
+_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# Entries disappear once no request for that mailbox holds the semaphore
+_account_semaphores = weakref.WeakValueDictionary()
+
+
+class GmailApiError(Exception):
+    def __init__(self, status_code: int, detail: str = ""):
+        super().__init__(f"Gmail API error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def account_semaphore(account_key: str) -> asyncio.Semaphore:
+    sem = _account_semaphores.get(account_key)
+    if sem is None:
+        sem = asyncio.Semaphore(GMAIL_ACCOUNT_CONCURRENCY)
+        _account_semaphores[account_key] = sem
+    return sem
+
+
+def _is_rate_limited(resp) -> bool:
+    if resp.status_code == 429:
+        return True
+    if resp.status_code != 403:
+        return False
+    try:
+        errors = resp.json().get("error", {}).get("errors", [])
+    except ValueError:
+        return False
+    return any(e.get("reason") in _RATE_LIMIT_REASONS for e in errors)
+
+
+def _backoff(attempt: int, retry_after: str = None) -> float:
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    # exponential backoff with full jitter, as Gmail's quota docs recommend
+    return random.uniform(0, min(GMAIL_BACKOFF_MAX, GMAIL_BACKOFF_BASE * 2 ** attempt))
+
+
+async def gmail_request(method: str, access_token: str, path: str, account_key: str,
+                        params: dict = None, json: dict = None) -> dict:
+    """
+    Call the Gmail API for one mailbox: bounded per-account concurrency,
+    backoff + retry on 429 / 403 rateLimitExceeded / 5xx.
+    """
+    url = path if path.startswith("https://") else f"{GMAIL_API}/{path.lstrip('/')}"
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    async with account_semaphore(account_key):
+        for attempt in range(GMAIL_MAX_RETRIES + 1):
+            resp = await get_client("gmail").request(method, url, headers=headers, params=params, json=json)
+
+            retryable = _is_rate_limited(resp) or resp.status_code >= 500
+            if retryable and attempt < GMAIL_MAX_RETRIES:
+                await asyncio.sleep(_backoff(attempt, resp.headers.get("Retry-After")))
+                continue
+
+            if resp.status_code >= 400:
+                raise GmailApiError(resp.status_code, resp.text[:300])
+            return resp.json()
+
+
+async def gmail_get(access_token: str, path: str, account_key: str, params: dict = None) -> dict:
+    return await gmail_request("GET", access_token, path, account_key, params=params)
+
+
+# ----------------------------
+# Batch retrieval
+# ----------------------------
+GMAIL_BATCH_URL = "https://gmail.googleapis.com/batch/gmail/v1"
+# Gmail accepts up to 100 calls per batch; above ~50 it starts rate limiting, hence the default
+GMAIL_BATCH_SIZE = min(100, int(os.getenv("GMAIL_BATCH_SIZE", "50")))
+
+
+class _MultipartHttpParser:
+    """
+    Incremental parser for a multipart/mixed batch response, fed one line at a time.
+    Each part wraps an HTTP response: part headers, blank line, status line,
+    HTTP headers, blank line, body.
+    """
+
+    def __init__(self, boundary: str):
+        self.delimiter = f"--{boundary}"
+        self.state = "preamble"
+        self._reset()
+
+    def _reset(self):
+        self.content_id = None
+        self.status = None
+        self.body = []
+
+    def _finish(self):
+        part = None
+        if self.state == "body" and self.status is not None:
+            part = (self.content_id, self.status, "\n".join(self.body))
+        self._reset()
+        return part
+
+    def feed(self, line: str):
+        """Returns (content_id, status, body) when a part completes, else None."""
+        if line.startswith(self.delimiter):
+            part = self._finish()
+            self.state = "done" if line.strip() == self.delimiter + "--" else "part_headers"
+            return part
+
+        if self.state == "part_headers":
+            if not line.strip():
+                self.state = "status"
+            elif line.lower().startswith("content-id:"):
+                self.content_id = line.split(":", 1)[1].strip().strip("<>")
+        elif self.state == "status":
+            if line.strip():
+                # "HTTP/1.1 200 OK"
+                self.status = int(line.split()[1])
+                self.state = "http_headers"
+        elif self.state == "http_headers":
+            if not line.strip():
+                self.state = "body"
+        elif self.state == "body":
+            self.body.append(line)
+        return None
+
+
+def _batch_boundary(content_type: str) -> str:
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary":
+            return value.strip('"')
+    raise GmailApiError(502, f"Batch response without boundary: {content_type}")
+
+
+async def _post_batch(access_token: str, msg_ids: list, account_key: str, fmt: str) -> dict:
+    """One multipart round trip; returns {msg_id: message} for the parts that came back 200."""
+    boundary = f"batch_{random.getrandbits(64):x}"
+    body = "".join(
+        f"--{boundary}\r\n"
+        "Content-Type: application/http\r\n"
+        f"Content-ID: <{msg_id}>\r\n\r\n"
+        f"GET /gmail/v1/users/me/messages/{msg_id}?format={fmt}\r\n\r\n"
+        for msg_id in msg_ids
+    ) + f"--{boundary}--\r\n"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": f"multipart/mixed; boundary={boundary}",
+    }
+
+    async with account_semaphore(account_key):
+        for attempt in range(GMAIL_MAX_RETRIES + 1):
+            async with get_client("gmail").stream("POST", GMAIL_BATCH_URL, headers=headers, content=body) as resp:
+                if resp.status_code != 200:
+                    await resp.aread()
+                    if (_is_rate_limited(resp) or resp.status_code >= 500) and attempt < GMAIL_MAX_RETRIES:
+                        retry_after = resp.headers.get("Retry-After")
+                    else:
+                        raise GmailApiError(resp.status_code, resp.text[:300])
+                else:
+                    # parse parts as they stream in instead of buffering the whole response
+                    parser = _MultipartHttpParser(_batch_boundary(resp.headers.get("Content-Type", "")))
+                    found = {}
+                    async for line in resp.aiter_lines():
+                        part = parser.feed(line)
+                        if not part:
+                            continue
+                        content_id, status, payload = part
+                        # Google echoes the id back as "response-<id>"
+                        msg_id = content_id.removeprefix("response-") if content_id else None
+                        if status == 200 and msg_id:
+                            try:
+                                found[msg_id] = pyjson.loads(payload)
+                            except ValueError:
+                                pass
+                    return found
+
+            await asyncio.sleep(_backoff(attempt, retry_after))
+
+
+async def batch_get_messages(access_token: str, msg_ids: list, account_key: str, fmt: str = "full"):
+    """
+    Fetch many messages with Gmail's batch endpoint (GMAIL_BATCH_SIZE per round trip).
+    Parts that fail inside a batch are retried as individual GETs.
+    Returns (messages: {id: message}, errors: {id: exception}).
+    """
+    msg_ids = list(dict.fromkeys(msg_ids))
+    chunks = [msg_ids[i:i + GMAIL_BATCH_SIZE] for i in range(0, len(msg_ids), GMAIL_BATCH_SIZE)]
+
+    messages = {}
+    outcomes = await asyncio.gather(
+        *[_post_batch(access_token, chunk, account_key, fmt) for chunk in chunks],
+        return_exceptions=True
+    )
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            print(f"⚠ Gmail batch failed, falling back to single GETs: {outcome}")
+        else:
+            messages.update(outcome)
+
+    missing = [i for i in msg_ids if i not in messages]
+    errors = {}
+    if missing:
+        singles = await asyncio.gather(
+            *[gmail_get(access_token, f"messages/{i}", account_key, params={"format": fmt}) for i in missing],
+            return_exceptions=True
+        )
+        for msg_id, result in zip(missing, singles):
+            if isinstance(result, Exception):
+                errors[msg_id] = result
+            else:
+                messages[msg_id] = result
+
+    return messages, errors
@@ -0,0 +1,185 @@
+# gmail_push.py
+import os
+import json
+import base64
+import asyncio
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from database import accounts_col
+from gmail_client import gmail_request
+from gmail_sync import sync_linked_account
+from token_manager import get_access_token, gmail_token_key
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+GMAIL_PUBSUB_TOPIC = os.getenv("GMAIL_PUBSUB_TOPIC")        # projects/<project>/topics/<topic>
+GMAIL_PUSH_TOKEN = os.getenv("GMAIL_PUSH_TOKEN")            # shared secret in the push subscription URL
+# Notifications for one mailbox arriving within this window produce a single sync
+GMAIL_PUSH_DEBOUNCE_SECONDS = float(os.getenv("GMAIL_PUSH_DEBOUNCE_SECONDS", "2"))
+# A watch lasts 7 days; Google recommends renewing daily
+GMAIL_WATCH_RENEW_BEFORE_HOURS = float(os.getenv("GMAIL_WATCH_RENEW_BEFORE_HOURS", "144"))
+GMAIL_WATCH_CHECK_SECONDS = float(os.getenv("GMAIL_WATCH_CHECK_SECONDS", "3600"))
+GMAIL_WATCH_CONCURRENCY = int(os.getenv("GMAIL_WATCH_CONCURRENCY", "10"))
+
+_scheduled: dict = {}   # gmail_email → debounce/sync task
+_syncing: set = set()   # mailboxes whose sync is running right now
+_rerun: set = set()     # mailboxes notified again while syncing: run once more afterwards
+_notified: dict = {}    # gmail_email → highest historyId seen in a notification
+_renewal_task = None
+_counters = {
+    "notifications": 0, "coalesced": 0, "ignored": 0, "syncs": 0, "up_to_date": 0,
+    "sync_errors": 0, "watch_renewed": 0, "watch_errors": 0,
+}
+
+
+# ----------------------------
+# Notifications
+# ----------------------------
+def decode_push(envelope: dict):
+    """Pub/Sub push envelope → (emailAddress, historyId), or None if it is not a Gmail notification."""
+    try:
+        data = json.loads(base64.b64decode(envelope["message"]["data"]))
+        return data["emailAddress"].lower(), int(data["historyId"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def schedule_sync(gmail_email: str, history_id: int):
+    """Debounce + coalesce: at most one pending sync per mailbox, plus one follow-up if mail lands mid-sync."""
+    _counters["notifications"] += 1
+    _notified[gmail_email] = max(history_id, _notified.get(gmail_email, 0))
+
+    task = _scheduled.get(gmail_email)
+    if task and not task.done():
+        _counters["coalesced"] += 1
+        if gmail_email in _syncing:
+            _rerun.add(gmail_email)
+        return
+    _scheduled[gmail_email] = asyncio.create_task(_debounced_sync(gmail_email))
+
+
+async def _debounced_sync(gmail_email: str):
+    try:
+        while True:
+            await asyncio.sleep(GMAIL_PUSH_DEBOUNCE_SECONDS)
+            _syncing.add(gmail_email)
+            try:
+                await sync_mailbox(gmail_email)
+            except Exception as e:
+                _counters["sync_errors"] += 1
+                print(f"❌ Push sync failed for {gmail_email}: {e}")
+            finally:
+                _syncing.discard(gmail_email)
+
+            if gmail_email not in _rerun:
+                break
+            _rerun.discard(gmail_email)
+    finally:
+        _scheduled.pop(gmail_email, None)
+
+
+async def sync_mailbox(gmail_email: str):
+    """Sync every link of this mailbox (one Gmail account can be linked by several users)."""
+    accounts = await accounts_col.find(
+        {"gmail_email": gmail_email, "refresh_token": {"$exists": True}}
+    ).to_list(None)
+    if not accounts:
+        _counters["ignored"] += 1
+        return
+
+    notified = _notified.get(gmail_email, 0)
+    for account in accounts:
+        # the cursor already covers this notification (e.g. a manual fetch got there first)
+        if account.get("history_id") and int(account["history_id"]) >= notified:
+            _counters["up_to_date"] += 1
+            continue
+        _counters["syncs"] += 1
+        result = await sync_linked_account(account)
+        print(f"✅ Push sync {gmail_email}: added={result['added']} skipped={result['skipped']} "
+              f"failed={result['failed']} resynced={result['resynced']}")
+
+
+def pending_syncs() -> int:
+    return len(_scheduled)
+
+
+# ----------------------------
+# Watch registration / renewal
+# ----------------------------
+async def register_watch(account: dict):
+    token = await get_access_token(
+        gmail_token_key(account["user_id"], account["gmail_email"]), account["refresh_token"]
+    )
+    resp = await gmail_request(
+        "POST", token, "watch", account["gmail_email"],
+        json={"topicName": GMAIL_PUBSUB_TOPIC, "labelIds": ["INBOX"], "labelFilterBehavior": "INCLUDE"}
+    )
+    # the history cursor is left alone: a first sync still does its bounded resync
+    await accounts_col.update_one(
+        {"_id": account["_id"]},
+        {"$set": {"watch_expiration": datetime.utcfromtimestamp(int(resp["expiration"]) / 1000)}}
+    )
+
+
+async def renew_watches():
+    """Register or renew every watch expiring within GMAIL_WATCH_RENEW_BEFORE_HOURS."""
+    if not GMAIL_PUBSUB_TOPIC:
+        return
+    due = await accounts_col.find({
+        "refresh_token": {"$exists": True},
+        "$or": [
+            {"watch_expiration": {"$exists": False}},
+            {"watch_expiration": {"$lt": datetime.utcnow() + timedelta(hours=GMAIL_WATCH_RENEW_BEFORE_HOURS)}},
+        ],
+    }).to_list(None)
+
+    sem = asyncio.Semaphore(GMAIL_WATCH_CONCURRENCY)
+
+    async def renew(account):
+        async with sem:
+            try:
+                await register_watch(account)
+                _counters["watch_renewed"] += 1
+            except Exception as e:
+                _counters["watch_errors"] += 1
+                print(f"❌ Gmail watch renewal failed for {account.get('gmail_email')}: {e}")
+
+    await asyncio.gather(*[renew(a) for a in due])
+
+
+async def _renewal_loop():
+    while True:
+        try:
+            await renew_watches()
+        except Exception as e:
+            print(f"❌ Gmail watch renewal pass failed: {e}")
+        await asyncio.sleep(GMAIL_WATCH_CHECK_SECONDS)
+
+
+async def start_gmail_push():
+    global _renewal_task
+    if GMAIL_PUBSUB_TOPIC and _renewal_task is None:
+        _renewal_task = asyncio.create_task(_renewal_loop())
+
+
+async def stop_gmail_push():
+    global _renewal_task
+    tasks = [t for t in [_renewal_task, *_scheduled.values()] if t]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _renewal_task = None
+
+
+def push_stats() -> dict:
+    return {
+        "enabled": bool(GMAIL_PUBSUB_TOPIC),
+        "pending_syncs": len(_scheduled),
+        "syncing": len(_syncing),
+        **_counters,
+    }
@@ -0,0 +1,246 @@
+# gmail_sync.py
+import os
+import re
+import asyncio
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from database import messages_col, accounts_col
+from gmail_client import gmail_get, batch_get_messages, GmailApiError
+from mime_parser import parse_message
+from sender_avatars import resolve_sender_colors
+from message_store import insert_new, EMAIL_KEY
+from body_store import offload_new, discard
+from scoring_queue import enqueue_scoring, pending_verdict_fields
+from token_manager import get_access_token, invalidate_token, gmail_token_key
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+# Upper bound on messages pulled by a full resync (first sync, or after the cursor expired)
+GMAIL_RESYNC_MAX = int(os.getenv("GMAIL_RESYNC_MAX", "500"))
+# history.list / messages.list page size (Gmail caps both at 500)
+GMAIL_PAGE_SIZE = 500
+# Syncs a failing message may hold the history cursor back before it is given up on
+GMAIL_SYNC_MAX_MESSAGE_ATTEMPTS = int(os.getenv("GMAIL_SYNC_MAX_MESSAGE_ATTEMPTS", "3"))
+
+
+# ----------------------------
+# Ingestion: Gmail message → pending doc → scoring queue
+# ----------------------------
+def parse_headers(data: dict):
+    """(subject, From header, sender address) of a Gmail message."""
+    subject = ""
+    from_header = ""
+    for h in data.get("payload", {}).get("headers", []):
+        if h["name"] == "Subject":
+            subject = h["value"]
+        if h["name"] == "From":
+            from_header = h["value"]
+
+    match = re.search(r"<(.+?)>", from_header)
+    sender = match.group(1) if match else from_header
+    return subject, from_header, sender
+
+
+async def build_email_doc(data: dict, user_id: str, gmail_email: str, char_color: str) -> dict:
+    subject, from_header, sender = parse_headers(data)
+
+    # large messages are parsed in a worker process
+    parsed = await parse_message(data.get("payload", {}))
+
+    # the ML fields are filled in by the scoring workers
+    return {
+        "gmail_id": data["id"],
+        "gmail_email": gmail_email,
+        "user_id": user_id,
+        "subject": subject,
+        "from": from_header,
+        "from_email": sender,
+        "char_color": char_color,
+        "snippet": data.get("snippet", ""),
+        "body": parsed["body"],
+        "body_format": parsed["body_format"],
+        "urls": parsed["urls"],
+        "attachments": parsed["attachments"],
+        "timestamp": int(data.get("internalDate", datetime.utcnow().timestamp() * 1000)),
+        **pending_verdict_fields()
+    }
+
+
+async def ingest_messages(access_token: str, user_id: str, gmail_email: str, msg_ids: list,
+                          notify: bool = True) -> dict:
+    """Store the ids not seen yet as pending docs and queue them for scoring (with a push unless notify=False)."""
+    msg_ids = list(dict.fromkeys(msg_ids))
+
+    # avoid duplicates: one lookup for the whole set
+    seen = await messages_col.find(
+        {"user_id": user_id, "gmail_id": {"$in": msg_ids}}, {"gmail_id": 1, "_id": 0}
+    ).to_list(None)
+    seen_ids = {doc["gmail_id"] for doc in seen}
+    new_ids = [i for i in msg_ids if i not in seen_ids]
+
+    fetched, fetch_errors = await batch_get_messages(access_token, new_ids, gmail_email)
+    # deleted / purged since it was listed: nothing to import, and it must not pin the cursor
+    gone = [i for i, err in fetch_errors.items() if isinstance(err, GmailApiError) and err.status_code == 404]
+    for msg_id in gone:
+        fetch_errors.pop(msg_id)
+    for msg_id, err in fetch_errors.items():
+        print(f"❌ Gmail message {msg_id} failed: {err}")
+
+    # one avatar lookup / upsert for the whole batch
+    senders = {msg_id: parse_headers(data)[2] for msg_id, data in fetched.items()}
+    colors = await resolve_sender_colors(list(senders.values()))
+
+    built = await asyncio.gather(
+        *[build_email_doc(data, user_id, gmail_email, colors[senders[msg_id]]) for msg_id, data in fetched.items()],
+        return_exceptions=True
+    )
+
+    docs = []
+    failed_ids = list(fetch_errors)
+    for msg_id, doc in zip(fetched, built):
+        if isinstance(doc, Exception):
+            print(f"❌ Gmail message {msg_id} failed: {doc}")
+            failed_ids.append(msg_id)
+        else:
+            docs.append(doc)
+
+    # bodies go to the compressed side collection first, then one unordered bulk upsert;
+    # rows a concurrent sync stored first count as skipped
+    docs = await offload_new("email", docs)
+    queued_ids, orphaned = [], []
+    skipped = len(seen_ids) + len(gone)
+    for doc, (status, value) in zip(docs, await insert_new(messages_col, docs, EMAIL_KEY)):
+        if status == "saved":
+            queued_ids.append(value)
+            continue
+        orphaned.append(doc["_id"])
+        if status == "duplicate":
+            skipped += 1
+        else:
+            print(f"❌ Gmail message {doc['gmail_id']} failed: {value}")
+            failed_ids.append(doc["gmail_id"])
+    await discard("email", orphaned)
+
+    await enqueue_scoring("email", user_id, queued_ids, notify=notify)
+
+    return {
+        "added": len(queued_ids),
+        "skipped": skipped,
+        "failed": len(failed_ids),
+        "failed_ids": failed_ids,
+        "ids": queued_ids,
+    }
+
+
+# ----------------------------
+# Listing: history cursor, or bounded full resync
+# ----------------------------
+async def _list_history(access_token: str, gmail_email: str, start_history_id: int):
+    """Ids added since the cursor, and the mailbox's current historyId. 404 → cursor expired."""
+    msg_ids, latest, page_token = [], start_history_id, None
+    while True:
+        params = {
+            "startHistoryId": str(start_history_id),
+            "historyTypes": "messageAdded",
+            "maxResults": GMAIL_PAGE_SIZE,
+        }
+        if page_token:
+            params["pageToken"] = page_token
+
+        page = await gmail_get(access_token, "history", gmail_email, params=params)
+        for record in page.get("history", []):
+            for added in record.get("messagesAdded", []):
+                msg = added.get("message", {})
+                if msg.get("id") and "DRAFT" not in msg.get("labelIds", []):
+                    msg_ids.append(msg["id"])
+
+        latest = max(latest, int(page.get("historyId", latest)))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return msg_ids, latest
+
+
+async def _full_resync(access_token: str, gmail_email: str, limit: int):
+    """Newest `limit` ids, and a cursor taken before listing so nothing in between is missed."""
+    profile = await gmail_get(access_token, "profile", gmail_email)
+    cursor = int(profile["historyId"])
+
+    msg_ids, page_token = [], None
+    while len(msg_ids) < limit:
+        params = {"maxResults": min(GMAIL_PAGE_SIZE, limit - len(msg_ids))}
+        if page_token:
+            params["pageToken"] = page_token
+
+        page = await gmail_get(access_token, "messages", gmail_email, params=params)
+        msg_ids.extend(m["id"] for m in page.get("messages", []) if m.get("id"))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            break
+    return msg_ids[:limit], cursor
+
+
+async def sync_account(account: dict, access_token: str, resync_limit: int = GMAIL_RESYNC_MAX) -> dict:
+    """
+    Bring one linked mailbox up to date. Uses the stored historyId cursor when there
+    is one; otherwise (first sync, or Gmail expired the cursor) pulls the newest
+    `resync_limit` messages. Returns added / skipped / failed / resynced counts.
+    """
+    user_id = account["user_id"]
+    gmail_email = account["gmail_email"]
+    cursor = account.get("history_id")
+
+    msg_ids, new_cursor, resynced = None, None, 0
+    if cursor:
+        try:
+            msg_ids, new_cursor = await _list_history(access_token, gmail_email, int(cursor))
+        except GmailApiError as e:
+            if e.status_code != 404:
+                raise
+            print(f"⚠ History cursor expired for {gmail_email}, running a full resync")
+
+    if msg_ids is None:
+        msg_ids, new_cursor = await _full_resync(access_token, gmail_email, resync_limit)
+        resynced = len(msg_ids)
+
+    # a resync imports existing mail: score it, but do not push an alert per old message
+    result = await ingest_messages(access_token, user_id, gmail_email, msg_ids, notify=not resynced)
+
+    # Failed messages hold the cursor back so the next sync retries them, but only for
+    # GMAIL_SYNC_MAX_MESSAGE_ATTEMPTS syncs: one message that never imports must not pin it.
+    attempts = account.get("sync_failures") or {}
+    failures = {msg_id: attempts.get(msg_id, 0) + 1 for msg_id in result["failed_ids"]}
+    retrying = {msg_id: n for msg_id, n in failures.items() if n < GMAIL_SYNC_MAX_MESSAGE_ATTEMPTS}
+    abandoned = [msg_id for msg_id in failures if msg_id not in retrying]
+    if abandoned:
+        print(f"⚠ Giving up on {len(abandoned)} Gmail messages of {gmail_email} after "
+              f"{GMAIL_SYNC_MAX_MESSAGE_ATTEMPTS} syncs: {', '.join(abandoned[:10])}")
+
+    # $max keeps a slower concurrent sync from moving the cursor backwards
+    update = {"$set": {"last_synced_at": datetime.utcnow(), "sync_failures": retrying}}
+    if not retrying:
+        update["$max"] = {"history_id": new_cursor}
+    await accounts_col.update_one({"_id": account["_id"]}, update)
+
+    result["resynced"] = resynced
+    result["abandoned"] = len(abandoned)
+    return result
+
+
+async def sync_linked_account(account: dict, resync_limit: int = GMAIL_RESYNC_MAX) -> dict:
+    """sync_account with a cached access token; a 401 refreshes the token once and retries."""
+    token_key = gmail_token_key(account["user_id"], account["gmail_email"])
+    access_token = await get_access_token(token_key, account["refresh_token"])
+    try:
+        return await sync_account(account, access_token, resync_limit)
+    except GmailApiError as e:
+        if e.status_code != 401:
+            raise
+        # revoked / rotated before its expiry
+        await invalidate_token(token_key)
+        access_token = await get_access_token(token_key, account["refresh_token"])
+        return await sync_account(account, access_token, resync_limit)
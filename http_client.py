@@ -0,0 +1,157 @@
+# http_client.py
+import os
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ----------------------------
+# Per-upstream settings
+# ----------------------------
+# Each upstream gets its own pooled client so a slow ML server cannot starve
+# the Gmail / OAuth pools (and vice-versa). Everything can be tuned from .env:
+#   <PREFIX>_HTTP_TIMEOUT, <PREFIX>_HTTP_MAX_CONNECTIONS,
+#   <PREFIX>_HTTP_MAX_KEEPALIVE, <PREFIX>_HTTP2
+UPSTREAMS = {
+    "ml": {
+        "env_prefix": "ML",
+        "timeout": 25.0,
+        "max_connections": 50,
+        "max_keepalive": 20,
+        "http2": False,
+    },
+    "google_oauth": {
+        "env_prefix": "GOOGLE_OAUTH",
+        "timeout": 10.0,
+        "max_connections": 20,
+        "max_keepalive": 10,
+        "http2": True,
+    },
+    "gmail": {
+        "env_prefix": "GMAIL",
+        "timeout": 20.0,
+        "max_connections": 100,
+        "max_keepalive": 50,
+        "http2": True,
+    },
+}
+
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+_clients: dict = {}
+_stats: dict = {}
+
+
+def _settings(name: str) -> dict:
+    base = UPSTREAMS[name]
+    prefix = base["env_prefix"]
+    return {
+        "timeout": float(os.getenv(f"{prefix}_HTTP_TIMEOUT", base["timeout"])),
+        "max_connections": int(os.getenv(f"{prefix}_HTTP_MAX_CONNECTIONS", base["max_connections"])),
+        "max_keepalive": int(os.getenv(f"{prefix}_HTTP_MAX_KEEPALIVE", base["max_keepalive"])),
+        "http2": _env_bool(f"{prefix}_HTTP2", base["http2"]),
+    }
+
+
+def _make_hooks(name: str) -> dict:
+    stats = _stats.setdefault(name, {"requests": 0, "responses": 0, "server_errors": 0})
+
+    # requests - responses = transport failures (timeouts, refused connections)
+    async def on_request(request: httpx.Request):
+        stats["requests"] += 1
+
+    async def on_response(response: httpx.Response):
+        stats["responses"] += 1
+        if response.status_code >= 500:
+            stats["server_errors"] += 1
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    cfg = _settings(name)
+    return httpx.AsyncClient(
+        timeout=cfg["timeout"],
+        limits=httpx.Limits(
+            max_connections=cfg["max_connections"],
+            max_keepalive_connections=cfg["max_keepalive"],
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        http2=cfg["http2"],
+        event_hooks=_make_hooks(name),
+    )
+
+
+# ----------------------------
+# Lifecycle (called from main.py lifespan)
+# ----------------------------
+async def start_http_clients():
+    for name in UPSTREAMS:
+        if name not in _clients:
+            _clients[name] = _build_client(name)
+
+
+async def close_http_clients():
+    for name, client in list(_clients.items()):
+        await client.aclose()
+        _clients.pop(name, None)
+
+
+def use_transport(transport: httpx.AsyncBaseTransport):
+    """Route every upstream through one transport (local stand-ins for benchmarks)."""
+    for name in UPSTREAMS:
+        _clients[name] = httpx.AsyncClient(
+            transport=transport,
+            timeout=_settings(name)["timeout"],
+            event_hooks=_make_hooks(name),
+        )
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Return the shared client for an upstream ("ml", "google_oauth", "gmail")."""
+    if name not in UPSTREAMS:
+        raise KeyError(f"Unknown upstream: {name}")
+
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        # Lazily created when used outside the app lifespan (scripts, workers)
+        client = _build_client(name)
+        _clients[name] = client
+    return client
+
+
+def upstream_timeout(name: str) -> float:
+    """Configured per-request timeout (seconds) for an upstream."""
+    return _settings(name)["timeout"]
+
+
+def pool_stats() -> dict:
+    """Connection pool + request counters per upstream, for sizing the pools."""
+    out = {}
+    for name in UPSTREAMS:
+        cfg = _settings(name)
+        entry = {"config": cfg, "counters": dict(_stats.get(name, {})), "open": False}
+
+        client = _clients.get(name)
+        if client is not None and not client.is_closed:
+            entry["open"] = True
+            # httpcore does not expose a public stats API, so read the pool state defensively
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+            idle = sum(1 for c in connections if c.is_idle())
+            entry["connections"] = {
+                "total": len(connections),
+                "idle": idle,
+                "active": len(connections) - idle,
+                "http2": sum(1 for c in connections if "HTTP/2" in repr(c)),
+            }
+        out[name] = entry
+    return out
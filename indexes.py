@@ -0,0 +1,202 @@
+# indexes.py
+"""
+Every index the app relies on, in one place.
+
+    python indexes.py apply   # create / update them
+    python indexes.py check   # report missing indexes and explain the hot queries; exit 1 on COLLSCAN
+"""
+import sys
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from database import (
+    users_col, otps_col, fcm_tokens_col, access_tokens_col,
+    accounts_col, messages_col, avatars_col, backfill_jobs_col,
+    sms_messages_col,
+    verdict_cache_col, scoring_jobs_col,
+)
+from verdict_cache import VERDICT_CACHE_SHARED_TTL
+
+# ----------------------------
+# Registry: (collection, keys, options)
+# ----------------------------
+INDEXES = [
+    # auth_db
+    (users_col, [("email", 1)], {"unique": True}),                  # get_current_user, login, signup
+    (otps_col, [("email", 1)], {}),
+    (otps_col, [("expires_at", 1)], {"expireAfterSeconds": 0}),
+    (fcm_tokens_col, [("user_id", 1)], {"unique": True}),
+    (access_tokens_col, [("expires_at", 1)], {"expireAfterSeconds": 0}),
+
+    # Mails_db
+    (accounts_col, [("user_id", 1), ("gmail_email", 1)], {"unique": True}),
+    (accounts_col, [("gmail_email", 1)], {}),                       # push notifications
+    (accounts_col, [("next_sync_at", 1), ("sync_lease_until", 1)], {}),
+    (messages_col, [("user_id", 1), ("gmail_id", 1)], {"unique": True}),
+    (messages_col, [("verdict_status", 1), ("_id", 1)], {}),        # scoring reconciliation
+    # mail tab keyset listing: unfiltered, per linked mailbox, per sender
+    (messages_col, [("user_id", 1), ("timestamp", -1), ("_id", -1)], {}),
+    (messages_col, [("user_id", 1), ("gmail_email", 1), ("timestamp", -1), ("_id", -1)], {}),
+    (messages_col, [("user_id", 1), ("from_email", 1), ("timestamp", -1), ("_id", -1)], {}),
+    (avatars_col, [("email", 1)], {"unique": True}),
+    (backfill_jobs_col, [("user_id", 1), ("gmail_email", 1)], {"unique": True}),
+    (backfill_jobs_col, [("status", 1), ("run_after", 1), ("created_at", 1)], {}),
+    (backfill_jobs_col, [("status", 1), ("lease_until", 1)], {}),
+
+    # Sms_db
+    (sms_messages_col, [("user_id", 1), ("address", 1), ("date_ms", 1)], {"unique": True}),
+    (sms_messages_col, [("verdict_status", 1), ("_id", 1)], {}),    # scoring reconciliation
+    (sms_messages_col, [("user_id", 1), ("date_ms", -1), ("_id", -1)], {}),     # keyset listing, dashboard
+
+    # Ml_db
+    (verdict_cache_col, [("created_at", 1)], {"expireAfterSeconds": VERDICT_CACHE_SHARED_TTL}),
+    (verdict_cache_col, [("model_version", 1)], {}),
+    (scoring_jobs_col, [("status", 1), ("run_after", 1), ("created_at", 1)], {}),
+    (scoring_jobs_col, [("status", 1), ("lease_until", 1)], {}),
+    (scoring_jobs_col, [("doc_id", 1)], {"unique": True}),          # one job per message
+    # sender_reputation is only read by _id
+]
+
+# ----------------------------
+# Hot queries checked by `python indexes.py check`
+# ----------------------------
+_NOW = datetime(2000, 1, 1)
+_OID = ObjectId("000000000000000000000000")
+HOT_QUERIES = [
+    ("current user by email", users_col, {"filter": {"email": "x@example.com"}}),
+    ("otp verification", otps_col, {"filter": {"email": "x@example.com", "otp": "000000", "verified": False,
+                                               "expires_at": {"$gt": _NOW}}}),
+    ("fcm tokens by user", fcm_tokens_col, {"filter": {"user_id": "u"}}),
+    ("linked account", accounts_col, {"filter": {"user_id": "u", "gmail_email": "g@gmail.com"}}),
+    ("push → accounts", accounts_col, {"filter": {"gmail_email": "g@gmail.com"}}),
+    ("gmail dedup", messages_col, {"filter": {"user_id": "u", "gmail_id": {"$in": ["a", "b"]}}}),
+    ("gmail listing", messages_col, {
+        "filter": {"user_id": "u", "$or": [{"timestamp": {"$lt": 0}}, {"timestamp": 0, "_id": {"$lt": _OID}}]},
+        "sort": [("timestamp", -1), ("_id", -1)],
+    }),
+    ("gmail listing by mailbox", messages_col, {
+        "filter": {"user_id": "u", "gmail_email": "g@gmail.com"}, "sort": [("timestamp", -1), ("_id", -1)],
+    }),
+    ("gmail listing by sender", messages_col, {
+        "filter": {"user_id": "u", "from_email": "a@example.com"}, "sort": [("timestamp", -1), ("_id", -1)],
+    }),
+    ("sms dedup", sms_messages_col, {"filter": {"user_id": "u", "address": "AX-BANK", "date_ms": 0}}),
+    ("sms listing", sms_messages_col, {
+        "filter": {"user_id": "u", "$or": [{"date_ms": {"$lt": 0}}, {"date_ms": 0, "_id": {"$lt": _OID}}]},
+        "sort": [("date_ms", -1), ("_id", -1)],
+    }),
+    ("sender avatars", avatars_col, {"filter": {"email": {"$in": ["a@example.com"]}}}),
+    ("scoring claim", scoring_jobs_col, {
+        "filter": {"$or": [{"status": "queued", "run_after": {"$lte": _NOW}},
+                           {"status": "leased", "lease_until": {"$lt": _NOW}}]},
+        "sort": [("created_at", 1)],
+    }),
+    ("backfill claim", backfill_jobs_col, {
+        "filter": {"$or": [{"status": "queued", "run_after": {"$lte": _NOW}},
+                           {"status": "leased", "lease_until": {"$lt": _NOW}}]},
+        "sort": [("created_at", 1)],
+    }),
+    ("sync scheduler claim", accounts_col, {
+        "filter": {
+            "refresh_token": {"$exists": True},
+            "$and": [
+                {"$or": [{"next_sync_at": {"$lte": _NOW}}, {"next_sync_at": {"$exists": False}}]},
+                {"$or": [{"sync_lease_until": {"$lt": _NOW}}, {"sync_lease_until": {"$exists": False}}]},
+            ],
+        },
+        "sort": [("next_sync_at", 1)],
+    }),
+    ("verdict cache by model", verdict_cache_col, {"filter": {"model_version": "v1"}}),
+    ("dashboard sms", sms_messages_col, {"pipeline": [
+        {"$match": {"user_id": "u", "verdict_status": {"$nin": ["pending", "unscored", "failed"]}}},
+    ]}),
+    ("dashboard mail", messages_col, {"pipeline": [
+        {"$match": {"user_id": "u", "verdict_status": {"$nin": ["pending", "unscored", "failed"]}}},
+    ]}),
+]
+
+
+def _label(col) -> str:
+    return f"{col.database.name}.{col.name}"
+
+
+async def apply_indexes() -> dict:
+    """Create every registered index. One failure (e.g. duplicates blocking a unique index) does not stop the rest."""
+    summary = {"ok": 0, "updated": 0, "failed": 0}
+    for col, keys, options in INDEXES:
+        try:
+            await col.create_index(keys, **options)
+            summary["ok"] += 1
+        except OperationFailure as e:
+            # IndexOptionsConflict on a TTL index: the TTL changed in config, update it in place
+            if e.code in (85, 86) and "expireAfterSeconds" in options:
+                await col.database.command(
+                    "collMod", col.name,
+                    index={"keyPattern": dict(keys), "expireAfterSeconds": options["expireAfterSeconds"]}
+                )
+                summary["updated"] += 1
+                continue
+            summary["failed"] += 1
+            print(f"❌ Index {_label(col)} {keys} failed: {e}")
+    return summary
+
+
+def _winning_stages(node, inside: bool = False):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "rejectedPlans":
+                continue
+            if key == "stage" and inside:
+                yield value
+            yield from _winning_stages(value, inside or key == "winningPlan")
+    elif isinstance(node, list):
+        for value in node:
+            yield from _winning_stages(value, inside)
+
+
+async def _explain(col, query: dict) -> dict:
+    if "pipeline" in query:
+        return await col.database.command(
+            "explain", {"aggregate": col.name, "pipeline": query["pipeline"], "cursor": {}},
+            verbosity="queryPlanner"
+        )
+    cursor = col.find(query["filter"])
+    if query.get("sort"):
+        cursor = cursor.sort(query["sort"])
+    return await cursor.limit(1).explain()
+
+
+async def check_indexes() -> bool:
+    ok = True
+
+    for col, keys, options in INDEXES:
+        existing = await col.index_information()
+        if not any(info["key"] == keys for info in existing.values()):
+            ok = False
+            print(f"❌ missing index {_label(col)} {keys} {options or ''}")
+
+    for name, col, query in HOT_QUERIES:
+        stages = set(_winning_stages(await _explain(col, query)))
+        if "COLLSCAN" in stages:
+            ok = False
+            print(f"❌ {name}: COLLSCAN on {_label(col)}")
+        else:
+            print(f"✅ {name}: {', '.join(sorted(stages)) or 'no plan'}")
+    return ok
+
+
+async def _main(command: str) -> int:
+    if command == "apply":
+        print(await apply_indexes())
+        return 0
+    if command == "check":
+        return 0 if await check_indexes() else 1
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "")))
@@ -0,0 +1,164 @@
+# lease_queue.py
+import os
+import socket
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+
+def job_ready(now: datetime) -> dict:
+    """Claim filter for job collections: queued and due, or leased by a worker that died."""
+    return {"$or": [
+        {"status": "queued", "run_after": {"$lte": now}},
+        {"status": "leased", "lease_until": {"$lt": now}},
+    ]}
+
+
+def job_claimed(now: datetime) -> dict:
+    return {"$set": {"status": "leased"}, "$inc": {"attempts": 1}}
+
+
+class LeaseQueue:
+    """
+    Documents claimed from a Mongo collection under a time-limited lease and worked
+    by a pool of asyncio workers (one per process, several processes per collection).
+
+    While a handler runs the lease is renewed, so a slow job is never picked up by a
+    second worker; a worker that dies stops renewing and its document is claimed again
+    once the lease runs out. Writes finishing a job should match guard(doc, worker_id).
+    """
+
+    def __init__(self, name: str, col, *, lease_seconds: float, poll_seconds: float,
+                 ready=job_ready, claimed=job_claimed, sort=(("created_at", 1),),
+                 owner_field: str = "lease_owner", until_field: str = "lease_until"):
+        self.name = name
+        self.col = col
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.ready = ready
+        self.claimed = claimed
+        self.sort = list(sort)
+        self.owner_field = owner_field
+        self.until_field = until_field
+        self.workers: list = []
+        self._wakeup = None
+
+    # ----------------------------
+    # Leasing
+    # ----------------------------
+    def guard(self, doc: dict, worker_id: str) -> dict:
+        return {"_id": doc["_id"], self.owner_field: worker_id}
+
+    async def claim(self, worker_id: str):
+        now = datetime.utcnow()
+        update = self.claimed(now) if self.claimed else {}
+        update.setdefault("$set", {}).update({
+            self.owner_field: worker_id,
+            self.until_field: now + timedelta(seconds=self.lease_seconds),
+        })
+        return await self.col.find_one_and_update(
+            self.ready(now), update, sort=self.sort, return_document=ReturnDocument.AFTER
+        )
+
+    async def _renew(self, doc: dict, worker_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self.col.update_one(
+                    self.guard(doc, worker_id),
+                    {"$set": {self.until_field: datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except Exception as e:
+                print(f"❌ {self.name} lease renewal failed: {e}")
+                continue
+            if not renewed.matched_count:
+                print(f"⚠ {self.name} lease lost on {doc['_id']}")
+                return
+
+    @asynccontextmanager
+    async def holding(self, doc: dict, worker_id: str):
+        """Keep the lease on `doc` alive for the duration of the block."""
+        heartbeat = asyncio.create_task(self._renew(doc, worker_id))
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+
+    async def retry_or_fail(self, doc: dict, worker_id: str, error: str, max_attempts: int, backoff: float) -> bool:
+        """Put a failed job back in the queue after `backoff` seconds, or mark it failed. True if it failed."""
+        failed = doc.get("attempts", 0) >= max_attempts
+        status = {"status": "failed"} if failed else {
+            "status": "queued",
+            "run_after": datetime.utcnow() + timedelta(seconds=backoff),
+        }
+        await self.col.update_one(
+            self.guard(doc, worker_id),
+            {"$set": {**status, "last_error": error[:300]},
+             "$unset": {self.owner_field: "", self.until_field: ""}}
+        )
+        return failed
+
+    # ----------------------------
+    # Workers
+    # ----------------------------
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _idle(self):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker_loop(self, worker_id: str, handler, on_error):
+        while True:
+            try:
+                doc = await self.claim(worker_id)
+            except Exception as e:
+                print(f"❌ {self.name} claim failed: {e}")
+                doc = None
+
+            if doc is None:
+                await self._idle()
+                continue
+
+            try:
+                async with self.holding(doc, worker_id):
+                    await handler(doc, worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ {self.name} {doc['_id']} failed: {e}")
+                if on_error is not None:
+                    try:
+                        await on_error(doc, worker_id, str(e))
+                    except Exception as e2:
+                        print(f"❌ {self.name} error handling failed: {e2}")
+
+    async def start(self, count: int, handler, on_error=None, suffix: str = ""):
+        if self.workers:
+            return
+        self._wakeup = asyncio.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}{suffix}"
+        for n in range(count):
+            self.workers.append(asyncio.create_task(self._worker_loop(f"{prefix}:{n}", handler, on_error)))
+
+    async def stop(self):
+        # documents being worked keep their lease and are picked up again after it expires
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    # ----------------------------
+    # Observability
+    # ----------------------------
+    async def depth(self) -> dict:
+        depth = {}
+        async for row in self.col.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            depth[row["_id"]] = row["count"]
+        return depth
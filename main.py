@@ -1,9 +1,42 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from routes import auth, gmail, Oauth, notifications, sms, fcm
+from http_client import start_http_clients, close_http_clients
+from ml_batcher import ml_batcher
+from mime_parser import shutdown_mime_pool
+from indexes import apply_indexes
+from gmail_push import start_gmail_push, stop_gmail_push
+from gmail_backfill import start_backfill_workers, stop_backfill_workers
+from sync_scheduler import start_sync_scheduler, stop_sync_scheduler
+from scoring_queue import start_scoring_workers, stop_scoring_workers
+from routes import auth, gmail, Oauth, analysis, sms, fcm, dashboard, metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_http_clients()
+    try:
+        await apply_indexes()
+    except Exception as e:
+        print(f"⚠ Could not create indexes: {e}")
+    await ml_batcher.start()
+    await start_scoring_workers()
+    await start_backfill_workers()
+    await start_gmail_push()
+    await start_sync_scheduler()
+    yield
+    await stop_sync_scheduler()
+    await stop_gmail_push()
+    await stop_backfill_workers()
+    await stop_scoring_workers()
+    await ml_batcher.stop()
+    await close_http_clients()
+    shutdown_mime_pool()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,9 +50,12 @@ app.add_middleware(
 app.include_router(auth.router, prefix="/auth")
 app.include_router(gmail.router, prefix="/gmail")
 app.include_router(Oauth.router, prefix="/auth")
-app.include_router(notifications.router, prefix="/notifications")
-app.include_router(sms.router, prefix="/")
+app.include_router(analysis.router, prefix="/analysis")
+app.include_router(analysis.legacy_router, prefix="/notifications")
+app.include_router(sms.router)
 app.include_router(fcm.router, prefix="/fcm")
+app.include_router(dashboard.router)
+app.include_router(metrics.router, prefix="/metrics")
 
 @app.get("/")
 async def root():
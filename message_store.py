@@ -0,0 +1,40 @@
+# message_store.py
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Natural keys; each is backed by a unique index (indexes.py)
+EMAIL_KEY = ("user_id", "gmail_id")
+SMS_KEY = ("user_id", "address", "date_ms")
+
+DUPLICATE_KEY = 11000
+
+
+async def insert_new(col, docs: list, key: tuple) -> list:
+    """
+    Write a batch idempotently: one unordered bulk_write of $setOnInsert upserts.
+    Returns one entry per doc: ("saved", _id), ("duplicate", None) or ("error", message).
+    A doc matching an existing row, or losing an insert race (E11000), is a duplicate.
+    """
+    if not docs:
+        return []
+
+    ops = [
+        UpdateOne({k: doc[k] for k in key}, {"$setOnInsert": doc}, upsert=True)
+        for doc in docs
+    ]
+    try:
+        result = await col.bulk_write(ops, ordered=False)
+        upserted, errors = result.upserted_ids, {}
+    except BulkWriteError as e:
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+        errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+
+    statuses = []
+    for i in range(len(docs)):
+        if i in upserted:
+            statuses.append(("saved", upserted[i]))
+        elif i in errors and errors[i].get("code") != DUPLICATE_KEY:
+            statuses.append(("error", errors[i].get("errmsg", "")))
+        else:
+            statuses.append(("duplicate", None))
+    return statuses
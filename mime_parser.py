@@ -0,0 +1,175 @@
+# mime_parser.py
+import os
+import re
+import html
+import base64
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+MIME_MAX_PART_BYTES = int(os.getenv("MIME_MAX_PART_BYTES", str(256 * 1024)))     # decoded bytes kept per text part
+MIME_MAX_BODY_CHARS = int(os.getenv("MIME_MAX_BODY_CHARS", "100000"))            # text handed to storage / ML
+MIME_MAX_PARTS = int(os.getenv("MIME_MAX_PARTS", "200"))
+MIME_MAX_URLS = int(os.getenv("MIME_MAX_URLS", "100"))
+# payloads whose encoded text parts exceed this are parsed in a worker process
+MIME_OFFLOAD_BYTES = int(os.getenv("MIME_OFFLOAD_BYTES", str(512 * 1024)))
+MIME_PROCESS_WORKERS = int(os.getenv("MIME_PROCESS_WORKERS", "2"))
+
+_pool = None
+
+_URL_RE = re.compile(r"https?://[^\s<>\"'()]+", re.I)
+_HREF_RE = re.compile(r"""href\s*=\s*["']?(https?://[^"'\s>]+)""", re.I)
+_DROP_BLOCKS_RE = re.compile(r"<(script|style|head|title)\b.*?</\1\s*>", re.I | re.S)
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+_BREAK_RE = re.compile(r"<\s*(?:br|/p|/div|/tr|/li|/h[1-6]|/table|hr)\b[^>]*>", re.I)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACES_RE = re.compile(r"[ \t\r\f\v]+")
+_LINE_EDGES_RE = re.compile(r" *\n *")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+_CHARSET_RE = re.compile(r"charset\s*=\s*\"?([\w.:-]+)", re.I)
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def _decode(data: str, limit: int) -> bytes:
+    """Decode Gmail's url-safe base64, but only as much as `limit` bytes need."""
+    chunk = data[: (limit + 2) // 3 * 4]
+    chunk += "=" * (-len(chunk) % 4)
+    try:
+        return base64.urlsafe_b64decode(chunk)[:limit]
+    except (ValueError, TypeError):
+        return b""
+
+
+def _charset(part: dict) -> str:
+    for h in part.get("headers", []) or []:
+        if h.get("name", "").lower() == "content-type":
+            m = _CHARSET_RE.search(h.get("value", ""))
+            if m:
+                return m.group(1)
+    return "utf-8"
+
+
+def _to_text(raw: bytes, charset: str) -> str:
+    try:
+        return raw.decode(charset, errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+
+def html_to_text(markup: str) -> str:
+    """Regex-only HTML → text: good enough for classification, far cheaper than a DOM parser."""
+    text = _DROP_BLOCKS_RE.sub(" ", markup)
+    text = _COMMENT_RE.sub(" ", text)
+    text = _BREAK_RE.sub("\n", text)
+    text = _TAG_RE.sub(" ", text)
+    text = html.unescape(text)
+    text = _LINE_EDGES_RE.sub("\n", _SPACES_RE.sub(" ", text))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def _is_attachment(part: dict) -> bool:
+    body = part.get("body", {}) or {}
+    return bool(part.get("filename")) or "attachmentId" in body
+
+
+def payload_size(payload: dict) -> int:
+    """Encoded size of the inline text parts, used to decide whether to offload parsing."""
+    total, stack = 0, [payload or {}]
+    while stack:
+        part = stack.pop()
+        if not _is_attachment(part):
+            total += len((part.get("body", {}) or {}).get("data") or "")
+        stack.extend(part.get("parts", []) or [])
+    return total
+
+
+# ----------------------------
+# Parser
+# ----------------------------
+def parse_payload(payload: dict) -> dict:
+    """
+    Walk a Gmail `format=full` payload without recursion and return
+    {"body", "body_format", "urls", "attachments"}.
+    text/plain wins over text/html; attachment bodies are never decoded.
+    """
+    plain, markup, attachments = None, None, []
+    stack, seen = [payload or {}], 0
+
+    while stack and seen < MIME_MAX_PARTS:
+        part = stack.pop()
+        seen += 1
+        mime_type = (part.get("mimeType") or "").lower()
+        children = part.get("parts") or []
+        if children:
+            # reversed so parts are visited in document order
+            stack.extend(reversed(children))
+            continue
+
+        body = part.get("body", {}) or {}
+        if _is_attachment(part):
+            attachments.append({
+                "filename": part.get("filename", ""),
+                "mime_type": mime_type,
+                "size": body.get("size", 0),
+                "attachment_id": body.get("attachmentId"),
+            })
+            continue
+
+        data = body.get("data")
+        if not data:
+            continue
+        if mime_type == "text/plain" and plain is None:
+            plain = _to_text(_decode(data, MIME_MAX_PART_BYTES), _charset(part))
+        elif mime_type == "text/html" and markup is None:
+            markup = _to_text(_decode(data, MIME_MAX_PART_BYTES), _charset(part))
+
+    urls = []
+    if markup:
+        urls.extend(_HREF_RE.findall(markup))
+
+    if plain and plain.strip():
+        text, body_format = plain.strip(), "plain"
+    elif markup:
+        text, body_format = html_to_text(markup), "html"
+    else:
+        text, body_format = "", ""
+
+    text = text[:MIME_MAX_BODY_CHARS]
+    urls.extend(_URL_RE.findall(text))
+
+    return {
+        "body": text,
+        "body_format": body_format,
+        "urls": list(dict.fromkeys(u.rstrip(".,;:!?") for u in urls))[:MIME_MAX_URLS],
+        "attachments": attachments,
+    }
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=MIME_PROCESS_WORKERS)
+    return _pool
+
+
+async def parse_message(payload: dict) -> dict:
+    """parse_payload, moved off the event loop when the message is large."""
+    if payload_size(payload) <= MIME_OFFLOAD_BYTES:
+        return parse_payload(payload)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), parse_payload, payload)
+
+
+def shutdown_mime_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
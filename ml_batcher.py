@@ -0,0 +1,224 @@
+# ml_batcher.py
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+
+from http_client import get_client
+from ml_resilience import ml_resilience
+from telemetry import Histogram
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+CYBER_SECURE_API_URI = os.getenv("CYBER_SECURE_API_URI")
+# Optional endpoint taking {"texts": [...]} and returning {"results": [...]} (or a bare list)
+CYBER_SECURE_BATCH_API_URI = os.getenv("CYBER_SECURE_BATCH_API_URI")
+
+ML_BATCH_MAX_SIZE = int(os.getenv("ML_BATCH_MAX_SIZE", "32"))
+ML_BATCH_MAX_WAIT_MS = float(os.getenv("ML_BATCH_MAX_WAIT_MS", "10"))
+ML_FANOUT_CONCURRENCY = int(os.getenv("ML_FANOUT_CONCURRENCY", "16"))
+
+# Status codes meaning "this upstream has no batch endpoint"
+_BATCH_UNSUPPORTED_STATUS = (404, 405, 415, 422)
+
+
+class BatchUnsupported(Exception):
+    pass
+
+
+class MlBatcher:
+    """
+    Coalesces concurrent single-text scoring calls into batched ML requests.
+
+    Callers await score(text); a collector task groups whatever arrives within
+    max_wait (up to max_size texts) and sends the group as one request. If the
+    upstream has no batch endpoint, groups are fanned out as single requests
+    under a concurrency cap instead.
+    """
+
+    def __init__(self, max_size: int = ML_BATCH_MAX_SIZE, max_wait_ms: float = ML_BATCH_MAX_WAIT_MS,
+                 fanout_concurrency: int = ML_FANOUT_CONCURRENCY):
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait_ms / 1000
+        self.fanout_concurrency = fanout_concurrency
+        self.batch_supported = bool(CYBER_SECURE_BATCH_API_URI)
+
+        self._queue = None
+        self._task = None
+        self._fanout_sem = None
+        self._inflight = set()
+
+        self.batch_size_hist = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_wait_hist = Histogram([1, 2, 5, 10, 20, 50, 100, 250, 500, 1000])   # ms
+        self.counters = {"texts": 0, "batch_requests": 0, "single_requests": 0, "batch_fallbacks": 0, "errors": 0}
+
+    # ----------------------------
+    # Lifecycle
+    # ----------------------------
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._fanout_sem = asyncio.Semaphore(self.fanout_concurrency)
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        # Nobody is left to serve queued callers
+        while self._queue is not None and not self._queue.empty():
+            _, fut, _ = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("ML batcher stopped"))
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    async def score(self, text: str) -> dict:
+        """Score one text; resolves with the raw ML response dict for that text."""
+        await self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut, time.perf_counter()))
+        return await fut
+
+    async def iter_many(self, texts: list):
+        """
+        Score an already-known list without waiting for the collection window.
+        Yields (index, result) as each request completes, so callers can stream
+        verdicts without waiting for the slowest batch; a result is the response
+        dict, or the exception for that text.
+        """
+        await self.start()
+        # Without a batch endpoint every text is its own request; keep them independent
+        size = self.max_size if self.batch_supported else 1
+        chunks = [(i, texts[i:i + size]) for i in range(0, len(texts), size)]
+        for _, chunk in chunks:
+            self.counters["texts"] += len(chunk)
+            self.batch_size_hist.observe(len(chunk))
+
+        async def run(offset: int, chunk: list):
+            return offset, await self._send(chunk)
+
+        for next_done in asyncio.as_completed([run(offset, chunk) for offset, chunk in chunks]):
+            offset, results = await next_done
+            for j, result in enumerate(results):
+                yield offset + j, result
+
+    def stats(self) -> dict:
+        return {
+            "batch_supported": self.batch_supported,
+            "max_size": self.max_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "counters": dict(self.counters),
+            "batch_size": self.batch_size_hist.snapshot(),
+            "queue_wait_ms": self.queue_wait_hist.snapshot(),
+        }
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            try:
+                while len(batch) < self.max_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # stopped mid-window: these callers are already off the queue, fail them here
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(RuntimeError("ML batcher stopped"))
+                raise
+
+            # Dispatch without blocking the next collection window
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: list):
+        now = time.perf_counter()
+        self.counters["texts"] += len(batch)
+        self.batch_size_hist.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            self.queue_wait_hist.observe((now - enqueued_at) * 1000)
+
+        try:
+            results = await self._send([text for text, _, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, fut, _), result in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+    async def _send(self, texts: list) -> list:
+        if self.batch_supported and len(texts) > 1:
+            try:
+                return await self._post_batch(texts)
+            except BatchUnsupported:
+                print("⚠ ML batch endpoint unavailable, falling back to single requests")
+                self.batch_supported = False
+                self.counters["batch_fallbacks"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                return [e] * len(texts)
+
+        return await asyncio.gather(*[self._post_single(t) for t in texts], return_exceptions=True)
+
+    async def _post_batch(self, texts: list) -> list:
+        async def request():
+            resp = await get_client("ml").post(CYBER_SECURE_BATCH_API_URI, json={"texts": texts})
+            if resp.status_code in _BATCH_UNSUPPORTED_STATUS:
+                raise BatchUnsupported()
+            resp.raise_for_status()
+            return resp.json()
+
+        self.counters["batch_requests"] += 1
+        data = await ml_resilience.run("batch", request)
+
+        results = data.get("results") if isinstance(data, dict) else data
+        if not isinstance(results, list) or len(results) != len(texts):
+            raise ValueError("ML batch response does not match request size")
+        return results
+
+    async def _post_single(self, text: str) -> dict:
+        async def request():
+            resp = await get_client("ml").post(CYBER_SECURE_API_URI, json={"text": text})
+            resp.raise_for_status()
+            return resp.json()
+
+        async with self._fanout_sem:
+            self.counters["single_requests"] += 1
+            try:
+                return await ml_resilience.run("single", request)
+            except Exception:
+                self.counters["errors"] += 1
+                raise
+
+ml_batcher = MlBatcher()
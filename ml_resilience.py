@@ -0,0 +1,219 @@
+# ml_resilience.py
+import os
+import time
+import random
+import asyncio
+from collections import deque
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+ML_BREAKER_FAILURES = int(os.getenv("ML_BREAKER_FAILURES", "5"))          # consecutive failures to open
+ML_BREAKER_OPEN_SECONDS = float(os.getenv("ML_BREAKER_OPEN_SECONDS", "30"))
+ML_MAX_RETRIES = int(os.getenv("ML_MAX_RETRIES", "2"))
+ML_RETRY_BUDGET_RATIO = float(os.getenv("ML_RETRY_BUDGET_RATIO", "0.2"))  # retries allowed per request
+ML_HEDGE_ENABLED = os.getenv("ML_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+ML_HEDGE_PERCENTILE = float(os.getenv("ML_HEDGE_PERCENTILE", "95"))
+ML_HEDGE_MIN_SAMPLES = int(os.getenv("ML_HEDGE_MIN_SAMPLES", "50"))
+
+
+class MlUnavailable(Exception):
+    """No verdict could be obtained (breaker open or retries exhausted)."""
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500 or exc.response.status_code == 429
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)."""
+
+    def __init__(self, window: int = 500):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def snapshot(self) -> dict:
+        def ms(v):
+            return round(v * 1000, 1) if v is not None else None
+        return {
+            "samples": len(self.samples),
+            "p50_ms": ms(self.percentile(50)),
+            "p95_ms": ms(self.percentile(95)),
+            "p99_ms": ms(self.percentile(99)),
+        }
+
+
+class CircuitBreaker:
+    """closed → (N consecutive failures) → open → (cooldown) → half_open → one probe decides."""
+
+    def __init__(self, failure_threshold: int = ML_BREAKER_FAILURES, open_seconds: float = ML_BREAKER_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.counters = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.counters["rejected"] += 1
+                return False
+            self.state = "half_open"
+
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                self.counters["rejected"] += 1
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"⚠ ML circuit breaker opened after {self.consecutive_failures} failures")
+                self.counters["opened"] += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures, **self.counters}
+
+
+class RetryBudget:
+    """Every request earns `ratio` retry tokens (capped); every retry spends one."""
+
+    def __init__(self, ratio: float = ML_RETRY_BUDGET_RATIO, cap: float = 20.0):
+        self.ratio = ratio
+        self.cap = cap
+        self.tokens = cap
+
+    def deposit(self):
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class MlResilience:
+    """Breaker + retry budget + optional hedging around calls to the ML upstream."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.budget = RetryBudget()
+        self.latency = {}
+        self.counters = {"calls": 0, "retries": 0, "retries_denied": 0, "hedges": 0, "hedge_wins": 0, "unavailable": 0}
+
+    def _tracker(self, kind: str) -> LatencyTracker:
+        return self.latency.setdefault(kind, LatencyTracker())
+
+    async def run(self, kind: str, fn):
+        """
+        Run `fn` (a zero-arg coroutine factory) with resilience.
+        `kind` separates latency tracking ("single" vs "batch" requests).
+        """
+        self.counters["calls"] += 1
+        self.budget.deposit()
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.counters["unavailable"] += 1
+                raise MlUnavailable("ML circuit breaker is open")
+
+            started = time.perf_counter()
+            try:
+                result = await self._hedged(kind, fn)
+            except Exception as e:
+                if not is_retryable(e):
+                    # caller-side problem (bad payload, unsupported endpoint): not an upstream outage
+                    self.breaker.probe_in_flight = False
+                    raise
+                self.breaker.record_failure()
+
+                if attempt >= ML_MAX_RETRIES:
+                    self.counters["unavailable"] += 1
+                    raise MlUnavailable(f"ML request failed after {attempt + 1} attempts: {e}") from e
+                if not self.budget.withdraw():
+                    self.counters["retries_denied"] += 1
+                    self.counters["unavailable"] += 1
+                    raise MlUnavailable(f"ML retry budget exhausted: {e}") from e
+
+                attempt += 1
+                self.counters["retries"] += 1
+                await asyncio.sleep(min(2.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.5))
+                continue
+
+            self.breaker.record_success()
+            self._tracker(kind).record(time.perf_counter() - started)
+            return result
+
+    async def _hedged(self, kind: str, fn):
+        tracker = self._tracker(kind)
+        if not ML_HEDGE_ENABLED or len(tracker.samples) < ML_HEDGE_MIN_SAMPLES:
+            return await fn()
+
+        primary = asyncio.create_task(fn())
+        done, _ = await asyncio.wait({primary}, timeout=tracker.percentile(ML_HEDGE_PERCENTILE))
+        if done:
+            return primary.result()
+
+        # Primary is slower than p95: race a second copy and keep whichever succeeds first
+        self.counters["hedges"] += 1
+        hedge = asyncio.create_task(fn())
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        calls = self.counters["calls"]
+        return {
+            "breaker": self.breaker.snapshot(),
+            "retry_budget_tokens": round(self.budget.tokens, 2),
+            "counters": dict(self.counters),
+            "hedge_rate": round(self.counters["hedges"] / calls, 4) if calls else 0.0,
+            "hedge_enabled": ML_HEDGE_ENABLED,
+            "latency": {kind: t.snapshot() for kind, t in self.latency.items()},
+        }
+
+
+ml_resilience = MlResilience()
@@ -0,0 +1,88 @@
+# pagination.py
+import json
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+from routes.dashboard import LABELS, BUCKET_BOUNDS
+
+# ----------------------------
+# Keyset cursors
+# ----------------------------
+def encode_cursor(value, _id: ObjectId) -> str:
+    """Opaque cursor for the last row of a page: its sort value and _id."""
+    raw = json.dumps([value, str(_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        value, oid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return value, ObjectId(oid)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(field: str, cursor: str) -> dict:
+    """Rows strictly after the cursor in (field desc, _id desc) order."""
+    value, oid = decode_cursor(cursor)
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, "_id": {"$lt": oid}},
+    ]}
+
+
+# ----------------------------
+# Filters
+# ----------------------------
+def bucket_filter(score_field: str, bucket: str) -> dict:
+    """Same buckets as the dashboard, plus `pending` for messages not scored yet."""
+    if bucket.lower() == "pending":
+        return {"verdict_status": "pending"}
+    labels = [label.lower() for label in LABELS]
+    if bucket.lower() not in labels:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(LABELS)} or pending")
+    i = labels.index(bucket.lower())
+    return {score_field: {"$gte": BUCKET_BOUNDS[i], "$lt": BUCKET_BOUNDS[i + 1]}}
+
+
+# ----------------------------
+# Serialization
+# ----------------------------
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def to_json_doc(doc: dict) -> dict:
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+
+async def ndjson_lines(cursor, hydrate=None, chunk_size: int = 200):
+    """
+    One JSON document per line, straight off the Mongo cursor: memory stays flat.
+    `hydrate(docs)` (e.g. loading stored bodies) runs once per chunk of documents.
+    """
+    chunk = []
+    async for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            for line in await _encode_chunk(chunk, hydrate):
+                yield line
+            chunk = []
+    if chunk:
+        for line in await _encode_chunk(chunk, hydrate):
+            yield line
+
+
+async def _encode_chunk(docs: list, hydrate) -> list:
+    if hydrate is not None:
+        await hydrate(docs)
+    return [json.dumps(doc, default=_json_default, ensure_ascii=False) + "\n" for doc in docs]
@@ -0,0 +1,267 @@
+# prefilter.py
+import os
+import re
+import hashlib
+from collections import deque
+from urllib.parse import urlsplit
+
+import yaml
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+# off     → never consulted
+# shadow  → decide, but always ask the model too and record whether they agree
+# enforce → a matching rule replaces the model call
+PREFILTER_MODE = os.getenv("PREFILTER_MODE", "shadow").lower()
+PREFILTER_RULES_PATH = os.getenv("PREFILTER_RULES_PATH")   # YAML or JSON rule table
+
+# Model scores that count as "agreeing" with a benign / malicious rule in shadow mode
+AGREE_BENIGN_MAX = 25
+AGREE_MALICIOUS_MIN = 76
+
+
+def _env_list(name: str) -> list:
+    return [v.strip().lower() for v in os.getenv(name, "").split(",") if v.strip()]
+
+
+# ----------------------------
+# Rule table
+# ----------------------------
+# A rule matches when every condition under "when" holds; the first match wins.
+# Conditions:
+#   sender_regex / body_regex / body_not_regex : regex (case-insensitive)
+#   sender_in / domain_in                      : name of a list under "lists", or an inline list
+#   has_urls / has_phone_numbers / has_money   : true / false
+# "channel" limits a rule to "sms" or "email"; "verdict" is benign | malicious.
+DEFAULT_RULE_TABLE = {
+    "lists": {
+        "bad_domains": _env_list("PREFILTER_BAD_DOMAINS"),
+        "denied_senders": _env_list("PREFILTER_DENIED_SENDERS"),
+        "trusted_senders": _env_list("PREFILTER_TRUSTED_SENDERS"),
+    },
+    "rules": [
+        {
+            "name": "known_bad_domain",
+            "when": {"domain_in": "bad_domains"},
+            "verdict": "malicious",
+            "score": 95,
+        },
+        {
+            "name": "denied_sender",
+            "when": {"sender_in": "denied_senders"},
+            "verdict": "malicious",
+            "score": 90,
+        },
+        {
+            "name": "otp_from_short_code",
+            "channel": "sms",
+            # numeric short codes (56767) or DLT headers (VM-HDFCBK, AXHDFCBK)
+            "when": {
+                "sender_regex": r"^(?:\d{4,6}|(?:[A-Z]{2}-)?[A-Z0-9]{6})$",
+                "body_regex": r"\b(?:otp|one[- ]time (?:password|passcode)|verification code)\b.*\b\d{4,8}\b|\b\d{4,8}\b.*\b(?:otp|verification code)\b",
+                "has_urls": False,
+            },
+            "verdict": "benign",
+            "score": 3,
+        },
+        {
+            "name": "trusted_sender_without_links",
+            "when": {"sender_in": "trusted_senders", "has_urls": False},
+            "verdict": "benign",
+            "score": 5,
+        },
+        {
+            "name": "plain_text_without_indicators",
+            "when": {
+                "has_urls": False,
+                "has_phone_numbers": False,
+                "has_money": False,
+                "body_not_regex": r"\b(?:urgent|verify|suspend|blocked|password|login|kyc|click|prize|won|lottery|claim|gift|reward|otp)\b",
+            },
+            "verdict": "benign",
+            "score": 5,
+        },
+    ],
+}
+
+URL_RE = re.compile(r"(?:https?://|www\.)[^\s<>\"')]+|\b(?:[a-z0-9-]+\.)+[a-z]{2,}(?:/[^\s<>\"')]*)?", re.I)
+PHONE_RE = re.compile(r"(?<!\d)\+?\d[\d\s-]{7,}\d(?!\d)")
+MONEY_RE = re.compile(
+    r"(?:₹|\$|€|£)\s?\d|\b(?:rs\.?|inr|usd|rupees?|amount|credited|debited|payment|refund|loan|cash|upi|bank|account)\b",
+    re.I,
+)
+
+
+def extract_urls(text: str) -> list:
+    return URL_RE.findall(text or "")
+
+
+def extract_domains(urls: list) -> set:
+    domains = set()
+    for url in urls:
+        host = urlsplit(url if "://" in url else f"http://{url}").hostname or ""
+        if host.startswith("www."):
+            host = host[4:]
+        if host:
+            domains.add(host.lower())
+    return domains
+
+
+def _label(score: float) -> str:
+    # same buckets as the dashboard
+    if score >= 76:
+        return "Critical"
+    if score >= 51:
+        return "Threat"
+    if score >= 26:
+        return "Suspicious"
+    return "Secure"
+
+
+class _CompiledRule:
+    def __init__(self, spec: dict, lists: dict):
+        self.name = spec["name"]
+        self.channel = spec.get("channel")
+        self.verdict = spec["verdict"]
+        self.score = spec["score"]
+
+        when = spec.get("when", {})
+        self.sender_re = re.compile(when["sender_regex"], re.I) if "sender_regex" in when else None
+        self.body_re = re.compile(when["body_regex"], re.I | re.S) if "body_regex" in when else None
+        self.body_not_re = re.compile(when["body_not_regex"], re.I) if "body_not_regex" in when else None
+        self.sender_in = self._resolve(when.get("sender_in"), lists)
+        self.domain_in = self._resolve(when.get("domain_in"), lists)
+        self.has_urls = when.get("has_urls")
+        self.has_phone_numbers = when.get("has_phone_numbers")
+        self.has_money = when.get("has_money")
+
+    @staticmethod
+    def _resolve(value, lists: dict):
+        if value is None:
+            return None
+        items = lists.get(value, []) if isinstance(value, str) else value
+        return {str(v).lower() for v in items}
+
+    def match(self, msg: dict):
+        """Return the text that triggered the rule, or None."""
+        if self.channel and self.channel != msg["channel"]:
+            return None
+        if self.sender_in is not None and msg["sender"].lower() not in self.sender_in:
+            return None
+        if self.sender_re and not self.sender_re.search(msg["sender"]):
+            return None
+        if self.has_urls is not None and bool(msg["urls"]) != self.has_urls:
+            return None
+        if self.has_phone_numbers is not None and bool(PHONE_RE.search(msg["text"])) != self.has_phone_numbers:
+            return None
+        if self.has_money is not None and bool(MONEY_RE.search(msg["text"])) != self.has_money:
+            return None
+        if self.body_not_re and self.body_not_re.search(msg["text"]):
+            return None
+
+        evidence = ""
+        if self.domain_in is not None:
+            # suffix match so "login.evil.com" hits "evil.com"
+            hit = next((d for d in msg["domains"]
+                        if any(d == bad or d.endswith("." + bad) for bad in self.domain_in)), None)
+            if not hit:
+                return None
+            evidence = hit
+        if self.body_re:
+            m = self.body_re.search(msg["text"])
+            if not m:
+                return None
+            evidence = m.group(0)
+        return evidence or msg["sender"]
+
+
+class Prefilter:
+    def __init__(self, table: dict, mode: str = PREFILTER_MODE):
+        self.mode = mode
+        lists = table.get("lists", {})
+        self.rules = [_CompiledRule(spec, lists) for spec in table.get("rules", [])]
+        self.counters = {
+            r.name: {"hits": 0, "shadow_agree": 0, "shadow_disagree": 0} for r in self.rules
+        }
+        self.totals = {"evaluated": 0, "decided": 0, "model_calls_saved": 0}
+        self.recent_disagreements = deque(maxlen=20)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("shadow", "enforce")
+
+    def evaluate(self, text: str, sender: str, channel: str):
+        """Return a verdict dict if a rule decides the message, else None."""
+        self.totals["evaluated"] += 1
+        urls = extract_urls(text)
+        msg = {
+            "text": text or "",
+            "sender": sender or "",
+            "channel": channel,
+            "urls": urls,
+            "domains": extract_domains(urls),
+        }
+
+        for rule in self.rules:
+            evidence = rule.match(msg)
+            if evidence is None:
+                continue
+
+            self.counters[rule.name]["hits"] += 1
+            self.totals["decided"] += 1
+            return {
+                "score": rule.score,
+                "confidence": 1 if rule.verdict == "malicious" else 0,
+                "reasoning": f"Matched local rule '{rule.name}'",
+                "highlighted_text": evidence,
+                "final_decision": _label(rule.score),
+                "suggestion": "Do not open links or reply to this message." if rule.verdict == "malicious" else "",
+                "verdict_source": "prefilter",
+                "rule": rule.name,
+            }
+        return None
+
+    def record_model_saved(self):
+        self.totals["model_calls_saved"] += 1
+
+    def record_shadow(self, decision: dict, model_result: dict, text: str):
+        """Compare a shadow decision with the model's verdict."""
+        score = model_result.get("score")
+        if score is None:
+            return
+
+        agrees = score <= AGREE_BENIGN_MAX if decision["confidence"] == 0 else score >= AGREE_MALICIOUS_MIN
+        key = "shadow_agree" if agrees else "shadow_disagree"
+        self.counters[decision["rule"]][key] += 1
+
+        if not agrees:
+            # never keep message content (OTPs, bank alerts): a hash is enough to spot repeats
+            self.recent_disagreements.append({
+                "rule": decision["rule"],
+                "rule_score": decision["score"],
+                "model_score": score,
+                "text_sha256": hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16],
+                "text_length": len(text or ""),
+            })
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "totals": dict(self.totals),
+            "rules": {name: dict(c) for name, c in self.counters.items()},
+            "recent_disagreements": list(self.recent_disagreements),
+        }
+
+
+def load_rule_table(path: str = PREFILTER_RULES_PATH) -> dict:
+    if not path:
+        return DEFAULT_RULE_TABLE
+    with open(path, "r", encoding="utf-8") as fh:
+        return yaml.safe_load(fh)   # JSON is valid YAML
+
+
+prefilter = Prefilter(load_rule_table())
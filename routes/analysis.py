@@ -1,47 +1,70 @@
+# routes/analysis.py
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from typing import List
-# We will need to import your auth dependency to protect these routes
-# from .auth import get_current_user
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Annotated
+from routes.notifications import call_ml_api, iter_ml_api_many, ML_MAX_TEXT_CHARS
+from .auth import get_current_user
+import json, os
 
 router = APIRouter()
 
+# Old home of /analyze-text: same bare-verdict response as before, but it now needs a bearer token
+legacy_router = APIRouter()
+
+ANALYZE_LIST_MAX = int(os.getenv("ANALYZE_LIST_MAX", "1000"))
+
+AnalyzedText = Annotated[str, Field(max_length=ML_MAX_TEXT_CHARS)]
+
 # Pydantic model for a single text
 class TextIn(BaseModel):
-    text: str
+    text: AnalyzedText
 
 # Pydantic model for a list of texts
 class TextListIn(BaseModel):
-    texts: List[str]
+    texts: List[AnalyzedText]
 
 @router.post("/analyze_text")
 async def analyze_text(
     data: TextIn,
-    # user: dict = Depends(get_current_user) # Uncomment to protect
+    user: dict = Depends(get_current_user)
 ):
     """
     Analyzes a single string of text.
-    (Add your model prediction logic here)
     """
-    print(f"Analyzing text: {data.text[:50]}...")
-    # TODO: Add your AI/ML model logic here
-    # result = your_model.predict([data.text])
+    if not data.text.strip():
+        raise HTTPException(status_code=400, detail="Missing text")
 
-    # Placeholder response
-    return {"status": "success", "text": data.text, "analysis": "placeholder_analysis"}
+    try:
+        result = await call_ml_api(data.text)
+    except Exception as e:
+        print(f"❌ ML API error: {e}")
+        raise HTTPException(status_code=502, detail="ML scoring failed")
+    return {"status": "success", "text": data.text, "analysis": result}
 
 @router.post("/analyze_sms_list")
 async def analyze_sms_list(
     data: TextListIn,
-    # user: dict = Depends(get_current_user) # Uncomment to protect
+    user: dict = Depends(get_current_user)
 ):
     """
     Analyzes a list of SMS messages.
-    (Add your model prediction logic here)
+    Streams one NDJSON line per text ({"index": i, ...verdict}) in completion order:
+    cached verdicts go out immediately, the rest as their ML batches return.
     """
+    if len(data.texts) > ANALYZE_LIST_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {ANALYZE_LIST_MAX} texts per request")
+
     print(f"Analyzing {len(data.texts)} messages...")
-    # TODO: Add your AI/ML model logic here
-    # results = your_model.predict(data.texts)
 
-    # Placeholder response
-    return {"status": "success", "count": len(data.texts), "analysis": "placeholder_analysis"}
\ No newline at end of file
+    async def lines():
+        async for i, result in iter_ml_api_many(data.texts):
+            yield json.dumps({"index": i, **result}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@legacy_router.post("/analyze-text")
+async def analyze_text_legacy(data: TextIn, user: dict = Depends(get_current_user)):
+    """/analysis/analyze_text, answering with the verdict dict alone as this route always has."""
+    return (await analyze_text(data, user))["analysis"]
@@ -1,13 +1,17 @@
 # routes/auth.py
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Body
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Body, Header, Query, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from passlib.context import CryptContext
 from dotenv import load_dotenv
-import datetime, jwt, os, base64
+import datetime, jwt, os
 
 from database import users_col, otps_col, accounts_col
 from routes import otp
+from user_avatars import (
+    save_avatar, load_avatar, avatar_url, InvalidAvatar,
+    AVATAR_MAX_UPLOAD_BYTES, AVATAR_CONTENT_TYPE, AVATAR_CACHE_SECONDS,
+)
 
 load_dotenv()
 router = APIRouter()
@@ -70,7 +74,8 @@ def decode_jwt(token: str):
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     decoded = decode_jwt(credentials.credentials)
     email = decoded.get("email")
-    user = await users_col.find_one({"email": email})
+    # runs on every authenticated request: skip the password hash and any legacy inline avatar
+    user = await users_col.find_one({"email": email}, {"password": 0, "avatar_base64": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -92,7 +97,6 @@ async def register(req: RegisterRequest):
         "email": req.email,
         "password": hashed_pw,
         "verified": False,
-        "avatar_base64": "",
         "fcm_tokens": [],
         "notification_pref": "all"
     }
@@ -157,17 +161,45 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
     return {
         "name": current_user.get("name"),
         "email": current_user.get("email"),
-        "avatar_base64": current_user.get("avatar_base64", ""),
+        "avatar_url": avatar_url(current_user),
+        "avatar_hash": current_user.get("avatar_hash"),
         "notification_pref": current_user.get("notification_pref", "all")
     }
 
 
 @router.post("/me/avatar")
 async def upload_avatar(current_user: dict = Depends(get_current_user), file: UploadFile = File(...)):
-    contents = await file.read()
-    encoded = base64.b64encode(contents).decode("utf-8")
-    await users_col.update_one({"_id": current_user["_id"]}, {"$set": {"avatar_base64": encoded}})
-    return {"avatar_base64": encoded}
+    # one byte over the cap is enough to reject it without reading the rest
+    contents = await file.read(AVATAR_MAX_UPLOAD_BYTES + 1)
+    if len(contents) > AVATAR_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Avatar must be at most {AVATAR_MAX_UPLOAD_BYTES} bytes")
+    try:
+        digest = await save_avatar(current_user["_id"], contents)
+    except InvalidAvatar:
+        raise HTTPException(status_code=400, detail="Invalid image")
+
+    return {"avatar_url": avatar_url({"avatar_hash": digest}), "avatar_hash": digest}
+
+
+@router.get("/me/avatar")
+async def get_avatar(
+    size: int = Query(256, ge=1, le=1024),
+    if_none_match: str = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    avatar = await load_avatar(current_user["_id"], size)
+    if not avatar:
+        raise HTTPException(status_code=404, detail="No avatar")
+
+    digest, data, stored_size = avatar
+    headers = {
+        "ETag": f'"{digest}-{stored_size}"',
+        # private: behind auth; immutable per ?v=<hash> URL, so clients can keep it for long
+        "Cache-Control": f"private, max-age={AVATAR_CACHE_SECONDS}",
+    }
+    if if_none_match and headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=AVATAR_CONTENT_TYPE, headers=headers)
 
 
 # ----------------------------
@@ -36,7 +36,8 @@ def _format_response(counts: Dict[int, int], summary: str = "", trends: list = [
 
 async def _aggregate_collection_by_buckets(col, user_id_field, score_field, user_id, days: int = None):
     """Aggregate a single collection into the 4 score buckets for a user."""
-    match_stage = {"$match": {user_id_field: user_id}}
+    # messages still waiting for (or given up on by) the scoring workers have no score yet
+    match_stage = {"$match": {user_id_field: user_id, "verdict_status": {"$nin": ["pending", "unscored", "failed"]}}}
     if days is not None:
         since_ms = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
         match_stage["$match"].update({
@@ -1,12 +1,12 @@
 # routes/fcm.py
 
 from fastapi import APIRouter, Depends
-from database import db
+from database import fcm_tokens_col
 from routes.auth import get_current_user
 
 router = APIRouter(prefix="/fcm")
 
-fcm_collection = db["fcm_tokens"]
+fcm_collection = fcm_tokens_col
 
 
 @router.post("/register")
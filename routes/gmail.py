@@ -1,68 +1,32 @@
 # routes/gmail.py
-from fastapi import APIRouter, Depends, HTTPException
-from database import messages_col, accounts_col, avatars_col
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from database import messages_col, accounts_col
 from routes.auth import get_current_user
-from routes.notifications import process_message_and_notify
-from pydantic import BaseModel
-import httpx
-from datetime import datetime
-import base64, random, re, os
+from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import BaseModel, Field
+from typing import Optional
+from gmail_client import GmailApiError
+from gmail_sync import sync_linked_account, GMAIL_RESYNC_MAX
+from token_manager import TokenRefreshError
+from gmail_push import decode_push, schedule_sync, GMAIL_PUSH_TOKEN
+from pagination import encode_cursor, after_cursor, bucket_filter, to_json_doc
+from body_store import load_fields
+import hmac
+import os
 
 router = APIRouter()
 
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+GMAIL_PAGE_SIZE = int(os.getenv("GMAIL_LIST_PAGE_SIZE", "50"))
+GMAIL_PAGE_MAX = int(os.getenv("GMAIL_LIST_PAGE_MAX", "200"))
 
-
-# ----------------------------
-# HELPER — Decode nested Gmail body
-# ----------------------------
-def extract_body(payload):
-    if not payload:
-        return ""
-
-    mime_type = payload.get("mimeType", "")
-    body_data = payload.get("body", {}).get("data")
-
-    if body_data and ("text/plain" in mime_type or "text/html" in mime_type):
-        try:
-            decoded = base64.urlsafe_b64decode(body_data).decode("utf-8", errors="ignore")
-            return decoded.strip()
-        except:
-            return ""
-
-    for part in payload.get("parts", []):
-        text = extract_body(part)
-        if text:
-            return text
-
-    return ""
-
-
-# ----------------------------
-# OPTIONAL — Consistent avatar colors
-# ----------------------------
-COLOR_PALETTE = [
-    "#4285F4", "#EA4335", "#FBBC05", "#34A853", "#9C27B0", "#00ACC1", "#7E57C2",
-    "#FF7043", "#F06292", "#4DB6AC", "#1A237E", "#B71C1C", "#1B5E20", "#0D47A1",
-    "#F57F17", "#880E4F", "#004D40", "#311B92", "#BF360C", "#33691E", "#C62828",
-    "#283593", "#00695C", "#4527A0", "#E64A19", "#1976D2", "#AD1457", "#00838F",
-    "#5D4037", "#455A64"
-]
-
-
-async def resolve_sender_color(sender: str):
-    existing = await avatars_col.find_one({"email": sender})
-    if existing and "char_color" in existing:
-        return existing["char_color"]
-
-    color = random.choice(COLOR_PALETTE)
-    await avatars_col.update_one(
-        {"email": sender},
-        {"$set": {"char_color": color}},
-        upsert=True
-    )
-    return color
+# list view: headers, snippet and verdict summary; the detail endpoint has the rest
+MAIL_LIST_PROJECTION = {
+    "gmail_id": 1, "gmail_email": 1, "subject": 1, "from": 1, "from_email": 1,
+    "char_color": 1, "snippet": 1, "timestamp": 1, "attachments": 1,
+    "verdict_status": 1, "spam_score": 1, "confidence": 1, "final_decision": 1,
+}
+MAIL_SORT = [("timestamp", -1), ("_id", -1)]
 
 
 # ----------------------------
@@ -70,6 +34,8 @@ async def resolve_sender_color(sender: str):
 # ----------------------------
 class FetchRequest(BaseModel):
     gmail_email: str
+    # only bounds a full resync (first sync, or an expired cursor); incremental syncs take everything new
+    max_results: int = Field(GMAIL_RESYNC_MAX, ge=1, le=GMAIL_RESYNC_MAX)
 
 
 @router.post("/gmail/fetch-latest")
@@ -82,104 +48,132 @@ async def fetch_latest(req: FetchRequest, current_user: dict = Depends(get_curre
         raise HTTPException(status_code=400, detail="Gmail account not linked")
 
     # --------------------------------------------
-    # Refresh access token
+    # Incremental sync from the stored historyId cursor
     # --------------------------------------------
-    async with httpx.AsyncClient() as client:
-        token_resp = await client.post(
-            "https://oauth2.googleapis.com/token",
-            data={
-                "client_id": GOOGLE_CLIENT_ID,
-                "client_secret": GOOGLE_CLIENT_SECRET,
-                "refresh_token": account["refresh_token"],
-                "grant_type": "refresh_token"
-            }
-        )
-
-    token_data = token_resp.json()
-    access_token = token_data.get("access_token")
-    if not access_token:
+    try:
+        result = await sync_linked_account(account, resync_limit=req.max_results)
+    except TokenRefreshError:
         raise HTTPException(status_code=400, detail="Failed to refresh access token")
+    except GmailApiError as e:
+        raise HTTPException(status_code=502, detail=f"Gmail sync failed ({e.status_code})")
 
-    # --------------------------------------------
-    # Pull last 10 Gmail messages
-    # --------------------------------------------
-    async with httpx.AsyncClient() as client:
-        inbox_resp = await client.get(
-            "https://gmail.googleapis.com/gmail/v1/users/me/messages?maxResults=10",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-
-    messages_list = inbox_resp.json().get("messages", [])
-    stored_count = 0
-
-    for msg in messages_list:
-        msg_id = msg.get("id")
-        if not msg_id:
-            continue
-
-        # avoid duplicates
-        if await messages_col.find_one({"gmail_id": msg_id, "user_id": user_id}):
-            continue
-
-        # fetch full message data
-        async with httpx.AsyncClient() as client:
-            full_resp = await client.get(
-                f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg_id}?format=full",
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
-
-        data = full_resp.json()
-
-        # extract headers
-        subject = ""
-        from_header = ""
-        for h in data["payload"]["headers"]:
-            if h["name"] == "Subject":
-                subject = h["value"]
-            if h["name"] == "From":
-                from_header = h["value"]
-
-        match = re.search(r"<(.+?)>", from_header)
-        sender = match.group(1) if match else from_header
-
-        body = extract_body(data.get("payload", {}))
-        snippet = data.get("snippet", "")
-        timestamp = int(data.get("internalDate", datetime.utcnow().timestamp() * 1000))
-
-        # run ML + optionally notify
-        result = await process_message_and_notify(
-            user_id=user_id,
-            message_text=body,
-            sender=sender,
-            channel="email"
-        )
-
-        # assign sender color
-        char_color = await resolve_sender_color(sender)
-
-        # final db object
-        email_doc = {
-            "gmail_id": msg_id,
-            "gmail_email": gmail_email,
-            "user_id": user_id,
-            "subject": subject,
-            "from": from_header,
-            "from_email": sender,
-            "char_color": char_color,
-            "snippet": snippet,
-            "body": body,
-            "timestamp": timestamp,
-
-            # ML score fields
-            "spam_score": result.get("score"),
-            "confidence": result.get("confidence"),
-            "reasoning": result.get("reasoning", ""),
-            "highlighted_text": result.get("highlighted_text", ""),
-            "final_decision": result.get("final_decision", ""),
-            "suggestion": result.get("suggestion", "")
-        }
+    return {
+        "status": "ok",
+        "new_inserted": result["added"],
+        "skipped": result["skipped"],
+        "failed": result["failed"],
+        "resynced": result["resynced"],
+        "ids": [str(i) for i in result["ids"]]
+    }
 
-        await messages_col.insert_one(email_doc)
-        stored_count += 1
 
-    return {"status": "ok", "new_inserted": stored_count}
+# ----------------------------
+# ROUTE: Gmail watch notifications (Pub/Sub push subscription)
+# ----------------------------
+@router.post("/push")
+async def gmail_push(request: Request, token: str = None):
+    """
+    Pub/Sub push endpoint, subscribed as .../gmail/push?token=<GMAIL_PUSH_TOKEN>.
+    Only schedules a debounced sync, so it acks immediately.
+    """
+    if not GMAIL_PUSH_TOKEN or not token or not hmac.compare_digest(token, GMAIL_PUSH_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    try:
+        envelope = await request.json()
+    except ValueError:
+        envelope = None
+    decoded = decode_push(envelope) if isinstance(envelope, dict) else None
+    if not decoded:
+        # ack anyway: Pub/Sub would redeliver a malformed message forever
+        print("⚠ Ignoring malformed Gmail push notification")
+        return {"status": "ignored"}
+
+    gmail_email, history_id = decoded
+    schedule_sync(gmail_email, history_id)
+    return {"status": "queued"}
+
+
+# ----------------------------
+# ROUTE: Mail tab
+# ----------------------------
+@router.get("/messages")
+async def list_messages(
+    limit: int = Query(GMAIL_PAGE_SIZE, ge=1, le=GMAIL_PAGE_MAX),
+    cursor: Optional[str] = None,
+    gmail_email: Optional[str] = None,
+    bucket: Optional[str] = None,
+    sender: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    One page of the user's emails, newest first, without bodies.
+    Pass `next_cursor` back as `cursor` for the next page; it is null on the last one.
+    """
+    query = {"user_id": current_user.get("user_id")}
+    if gmail_email:
+        query["gmail_email"] = gmail_email
+    if sender:
+        query["from_email"] = sender
+    if bucket:
+        query.update(bucket_filter("spam_score", bucket))
+    if cursor:
+        query = {"$and": [query, after_cursor("timestamp", cursor)]}
+
+    # one extra row tells us whether another page exists
+    msgs = await messages_col.find(query, MAIL_LIST_PROJECTION).sort(MAIL_SORT).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(msgs) > limit:
+        msgs = msgs[:limit]
+        next_cursor = encode_cursor(msgs[-1]["timestamp"], msgs[-1]["_id"])
+
+    return {
+        "count": len(msgs),
+        "messages": [to_json_doc(m) for m in msgs],
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/messages/{message_id}")
+async def get_message(message_id: str, current_user: dict = Depends(get_current_user)):
+    """Full stored email, body and verdict details included."""
+    try:
+        oid = ObjectId(message_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid id")
+
+    doc = await messages_col.find_one({"_id": oid, "user_id": current_user.get("user_id")}, {"user_id": 0})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Message not found")
+    # the only place bodies are read back from the body store
+    await load_fields("email", [doc])
+
+    doc.setdefault("verdict_status", "scored")
+    return to_json_doc(doc)
+
+
+@router.get("/verdict/{message_id}")
+async def get_email_verdict(message_id: str, current_user: dict = Depends(get_current_user)):
+    """Poll the verdict of an email stored by /gmail/fetch-latest."""
+    try:
+        oid = ObjectId(message_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid id")
+
+    doc = await messages_col.find_one(
+        {"_id": oid, "user_id": current_user.get("user_id")},
+        {
+            "gmail_id": 1, "from_email": 1, "subject": 1, "verdict_status": 1,
+            "spam_score": 1, "confidence": 1, "reasoning": 1, "highlighted_text": 1,
+            "final_decision": 1, "suggestion": 1, "stored_fields": 1
+        }
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Message not found")
+    await load_fields("email", [doc], ("reasoning", "highlighted_text"))
+
+    doc["_id"] = str(doc["_id"])
+    # rows stored before the async pipeline are already scored
+    doc.setdefault("verdict_status", "scored")
+    return doc
@@ -0,0 +1,110 @@
+# routes/metrics.py
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from http_client import pool_stats
+from body_store import body_store_stats
+from gmail_backfill import backfill_stats
+from gmail_push import push_stats
+from ml_batcher import ml_batcher
+from ml_resilience import ml_resilience
+from prefilter import prefilter
+from sender_avatars import sender_cache_stats
+from sender_reputation import reputation_stats
+from scoring_queue import scoring_queue_stats
+from sync_scheduler import scheduler_stats, sync_lag
+from token_manager import token_stats
+from verdict_cache import verdict_cache_stats, invalidate_verdicts
+
+router = APIRouter()
+
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+
+def require_admin(x_admin_key: str = Header(None)):
+    if not ADMIN_API_KEY or x_admin_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/http")
+async def http_metrics():
+    """Outbound HTTP pool usage per upstream (ML, Google OAuth, Gmail)."""
+    return pool_stats()
+
+
+@router.get("/verdict-cache")
+async def verdict_cache_metrics():
+    """Hit / miss counters for the ML verdict cache."""
+    return verdict_cache_stats()
+
+
+@router.post("/verdict-cache/invalidate", dependencies=[Depends(require_admin)])
+async def verdict_cache_invalidate(model_version: str = None):
+    """Flush cached verdicts after a model change (all versions unless one is given)."""
+    deleted = await invalidate_verdicts(model_version)
+    return {"status": "ok", "deleted": deleted}
+
+
+@router.get("/ml-batcher")
+async def ml_batcher_metrics():
+    """Batch size and queue-wait histograms for the ML micro-batcher."""
+    return ml_batcher.stats()
+
+
+@router.get("/scoring-queue")
+async def scoring_queue_metrics():
+    """Depth per status and age of the oldest job in the persistent scoring queue."""
+    return await scoring_queue_stats()
+
+
+@router.get("/ml-resilience")
+async def ml_resilience_metrics():
+    """Circuit breaker state, retry budget, hedge rate and latency percentiles for the ML upstream."""
+    return ml_resilience.stats()
+
+
+@router.get("/prefilter", dependencies=[Depends(require_admin)])
+async def prefilter_metrics():
+    """Per-rule hit counters and shadow-mode agreement with the model."""
+    return prefilter.stats()
+
+
+@router.get("/sender-reputation")
+async def sender_reputation_metrics():
+    """Reputation lookups, cache hits and how often the model was skipped."""
+    return reputation_stats()
+
+
+@router.get("/tokens")
+async def token_metrics():
+    """Access-token cache hits, refreshes and refreshes merged into one in-flight request."""
+    return token_stats()
+
+
+@router.get("/gmail-push")
+async def gmail_push_metrics():
+    """Push notifications received, coalesced into pending syncs, and watch renewals."""
+    return push_stats()
+
+
+@router.get("/sync-scheduler", dependencies=[Depends(require_admin)])
+async def sync_scheduler_metrics(limit: int = Query(100, ge=1, le=1000)):
+    """Background Gmail sync: in-flight syncs, claim lag and per-account lag (stalest first)."""
+    return {**scheduler_stats(), **await sync_lag(limit)}
+
+
+@router.get("/gmail-backfill")
+async def gmail_backfill_metrics():
+    """Backfill jobs per status and pages / messages imported by this process."""
+    return await backfill_stats()
+
+
+@router.get("/sender-avatars")
+async def sender_avatar_metrics():
+    """Sender color cache size, hits and batched avatars_col lookups."""
+    return sender_cache_stats()
+
+
+@router.get("/body-store")
+async def body_store_metrics():
+    """Fields moved to the compressed body store by this process and the compression ratio."""
+    return body_store_stats()
@@ -1,110 +1,184 @@
 # routes/notifications.py
-from fastapi import APIRouter, HTTPException
 import os
-import httpx
+import asyncio
 from dotenv import load_dotenv
 from fcm_service import send_fcm_notification
 from database import users_col
+from bson import ObjectId
+from bson.errors import InvalidId
+from ml_batcher import ml_batcher
+from ml_resilience import MlUnavailable
+from prefilter import prefilter
+from sender_reputation import get_reputation, record_score, fast_path as reputation_fast_path
+from verdict_cache import get_cached_verdict, get_cached_verdicts, store_verdict, set_model_version
 
 load_dotenv()
-router = APIRouter()
 
 CYBER_SECURE_API_URI = os.getenv("CYBER_SECURE_API_URI")
 THRESHOLD = 75  # final fixed value
+# longest text sent to the model, for ingested messages and /analysis alike
+ML_MAX_TEXT_CHARS = int(os.getenv("ML_MAX_TEXT_CHARS", "5000"))
 
 if not CYBER_SECURE_API_URI:
     raise Exception("CYBER_SECURE_API_URI is missing in .env file")
 
 
+def _unscored_result() -> dict:
+    """No verdict available (ML down / breaker open). Never stored as a real score."""
+    return {
+        "verdict_status": "unscored",
+        "score": None,
+        "confidence": None,
+        "reasoning": "",
+        "highlighted_text": "",
+        "final_decision": "",
+        "suggestion": "",
+    }
+
+
+def _normalize_ml_response(data: dict) -> dict:
+    return {
+        "score": data.get("score", 0),                        # 0–100
+        "confidence": data.get("confidence", None),           # 0 (ham) | 1 (spam)
+        "reasoning": data.get("reasoning", ""),
+        "highlighted_text": data.get("highlighted_text", ""),
+        "final_decision": data.get("final_decision", ""),
+        "suggestion": data.get("suggestion", ""),
+    }
+
+
+async def _accept_ml_response(text: str, data: dict) -> dict:
+    # A model reporting a new version invalidates everything cached for the old one
+    if data.get("model_version"):
+        await set_model_version(str(data["model_version"]))
+
+    result = _normalize_ml_response(data)
+    await store_verdict(text, result)
+    return result
+
+
 async def call_ml_api(text: str) -> dict:
-    """Send message text to ML model and return normalized response dict."""
+    """
+    Send message text to ML model and return normalized response dict.
+    An unreachable model gives an "unscored" result; anything else (a 4xx, a
+    malformed response) is raised, as retrying later will not change it.
+    """
+    cached = await get_cached_verdict(text)
+    if cached is not None:
+        return cached
+
     try:
-        async with httpx.AsyncClient(timeout=25) as client:
-            resp = await client.post(CYBER_SECURE_API_URI, json={"text": text})
-            resp.raise_for_status()
-            data = resp.json()
-
-        # Normalize expected output
-        return {
-            "score": data.get("score", 0),                        # 0–100
-            "confidence": data.get("confidence", None),           # 0 (ham) | 1 (spam)
-            "reasoning": data.get("reasoning", ""),
-            "highlighted_text": data.get("highlighted_text", ""),
-            "final_decision": data.get("final_decision", ""),
-            "suggestion": data.get("suggestion", ""),
-        }
-    except Exception as e:
-        print(f"❌ ML API error: {e}")
-        return {
-            "score": 0,
-            "confidence": None,
-            "reasoning": "",
-            "highlighted_text": "",
-            "final_decision": "",
-            "suggestion": "",
-        }
-
-
-async def should_send_notification(user_id: str, score: float) -> bool:
-    """Check notification preference logic before sending push alert."""
-    user = await users_col.find_one({"_id": user_id}) or await users_col.find_one({"user_id": str(user_id)})
+        # Concurrent callers are coalesced into batched requests
+        data = await ml_batcher.score(text)
+    except MlUnavailable as e:
+        print(f"❌ ML API unavailable: {e}")
+        # failures are never cached
+        return _unscored_result()
+
+    return await _accept_ml_response(text, data)
+
+
+async def iter_ml_api_many(texts: list):
+    """
+    Score a known list of texts, yielding (index, result) in completion order:
+    cache hits first, then the misses as their batched requests come back.
+    """
+    misses = []
+    # one round trip to the shared layer for the whole list
+    for i, cached in enumerate(await get_cached_verdicts(texts)):
+        if cached is None:
+            misses.append(i)
+        else:
+            yield i, cached
+
+    if not misses:
+        return
+
+    async for j, data in ml_batcher.iter_many([texts[i] for i in misses]):
+        i = misses[j]
+        if isinstance(data, MlUnavailable):
+            print(f"❌ ML API unavailable: {data}")
+            yield i, _unscored_result()
+        elif isinstance(data, Exception):
+            print(f"❌ ML API error: {data}")
+            yield i, {**_unscored_result(), "verdict_status": "failed"}
+        else:
+            yield i, await _accept_ml_response(texts[i], data)
 
-    pref = user.get("notification_pref", "all") if user else "all"
+
+async def _find_user(user_id: str, projection: dict = None):
+    # user_id travels around as str(ObjectId); fall back to legacy string keys
+    try:
+        user = await users_col.find_one({"_id": ObjectId(str(user_id))}, projection)
+    except InvalidId:
+        user = None
+    return user or await users_col.find_one({"user_id": str(user_id)}, projection)
+
+
+async def get_notification_pref(user_id: str) -> str:
+    user = await _find_user(user_id, {"notification_pref": 1})
+    return user.get("notification_pref", "all") if user else "all"
+
+
+async def should_send_notification(user_id: str, score: float, pref: str = None) -> bool:
+    """Check notification preference logic before sending push alert."""
+    if pref is None:
+        pref = await get_notification_pref(user_id)
 
     if pref == "high_only":
         return score >= THRESHOLD
     return True
 
 
-async def trigger_notification(user_id: str, channel: str, sender: str, score: float):
+async def trigger_notification(user_id: str, channel: str, sender: str, score: float, pref: str = None):
     """Trigger FCM only if preference + threshold rules are satisfied."""
 
-    if not await should_send_notification(user_id, score):
+    if not await should_send_notification(user_id, score, pref):
         print("⚠ Notification skipped due to user preference")
         return
 
-    body = f"{sender} • Risk Score: {score}"
-
-    await send_fcm_notification(
-        user_id=str(user_id),
-        title="New Risk Alert",
-        body=body,
-        channel=channel,        # "sms" OR "gmail"
-        score=score
-    )
-
+    user = await _find_user(user_id, {"fcm_tokens": 1})
+    tokens = (user or {}).get("fcm_tokens", [])
+    if not tokens:
+        return
 
-@router.post("/analyze-text")
-async def analyze_text(payload: dict):
-    """Public route (optional) for frontend to test ML scoring."""
-    text = payload.get("text", "")
-    if not text:
-        raise HTTPException(status_code=400, detail="Missing text")
+    body = f"{sender} • Risk Score: {score}"
 
-    return await call_ml_api(text)
+    # firebase_admin is blocking, keep it off the event loop
+    for token in tokens:
+        await asyncio.to_thread(
+            send_fcm_notification,
+            token=token,
+            title="New Risk Alert",
+            body=body,
+            data={"channel": channel, "sender": sender, "score": score}   # "sms" OR "email"
+        )
 
 
-async def process_message_and_notify(
-    user_id: str,
-    message_text: str,
-    sender: str,
-    channel: str
-) -> dict:
+async def score_message(message_text: str, sender: str, channel: str, user_id: str) -> dict:
     """
-    Shared function used by SMS + Gmail route after saving into DB.
-    Returns enriched ML data back to the caller.
+    Single entry point for scoring an ingested message.
+    Order: local rules → sender reputation → ML model. Model verdicts feed the
+    sender's reputation in this user's history, and every verdict carries the reputation it saw.
     """
+    decision = prefilter.evaluate(message_text, sender, channel) if prefilter.enabled else None
 
-    result = await call_ml_api(message_text)
+    if decision and prefilter.mode == "enforce":
+        prefilter.record_model_saved()
+        return decision
 
-    score = result["score"]
+    reputation = await get_reputation(channel, user_id, sender)
+    fast = reputation_fast_path(reputation, message_text)
+    if fast:
+        fast["sender_reputation"] = reputation
+        return fast
 
-    # Send push if qualified
-    await trigger_notification(
-        user_id=user_id,
-        channel=channel,
-        sender=sender,
-        score=score
-    )
+    result = await call_ml_api(message_text[:ML_MAX_TEXT_CHARS])
+    if decision:
+        prefilter.record_shadow(decision, result, message_text)
 
+    if result.get("verdict_status") != "unscored":
+        await record_score(channel, user_id, sender, result.get("score"))
+    result["sender_reputation"] = reputation
     return result
+
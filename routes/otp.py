@@ -5,11 +5,12 @@ import random
 import base64
 from email.mime.text import MIMEText
 
-import httpx
 from datetime import datetime,timedelta
 from dotenv import load_dotenv
 load_dotenv()
 from database import auth_db
+from http_client import get_client
+from token_manager import get_access_token, invalidate_token, OTP_SENDER_KEY, TokenRefreshError
 
 # -------------------
 # Config & DB
@@ -19,26 +20,17 @@ otp_col = auth_db.otps
 
 SMTP_EMAIL = os.getenv("SMTP_EMAIL")  # eg. "aegissecure25@gmail.com"
 REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")  # Gmail API refresh token
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 
 # -------------------
 # Gmail API helper
 # -------------------
 async def get_access_token_from_refresh(refresh_token: str) -> str:
-    """Get new access token from refresh token."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            "https://oauth2.googleapis.com/token",
-            data={
-                "client_id": GOOGLE_CLIENT_ID,
-                "client_secret": GOOGLE_CLIENT_SECRET,
-                "refresh_token": refresh_token,
-                "grant_type": "refresh_token"
-            }
-        )
-        data = resp.json()
-        return data.get("access_token")
+    """Access token for the OTP sender account, cached until shortly before it expires."""
+    try:
+        return await get_access_token(OTP_SENDER_KEY, refresh_token)
+    except TokenRefreshError as e:
+        print(f"❌ OTP sender token refresh failed: {e}")
+        return None
 
 
 async def send_gmail_email(access_token: str, to_email: str, subject: str, body: str):
@@ -49,18 +41,20 @@ async def send_gmail_email(access_token: str, to_email: str, subject: str, body:
     message["subject"] = subject
     raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            "https://gmail.googleapis.com/gmail/v1/users/me/messages/send",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            json={"raw": raw_message}
-        )
-        if resp.status_code != 200:
-            raise Exception(f"Failed to send email: {resp.text}")
-        return resp.json()
+    resp = await get_client("gmail").post(
+        "https://gmail.googleapis.com/gmail/v1/users/me/messages/send",
+        headers={
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        },
+        json={"raw": raw_message}
+    )
+    if resp.status_code == 401:
+        # cached token was revoked early; the next OTP refreshes it
+        await invalidate_token(OTP_SENDER_KEY)
+    if resp.status_code != 200:
+        raise Exception(f"Failed to send email: {resp.text}")
+    return resp.json()
 
 # -------------------
 # OTP helpers
@@ -250,9 +244,3 @@ async def verify_otp_in_db(email: str, otp: str) -> bool:
         await otp_col.update_one({"_id": doc["_id"]}, {"$set": {"verified": True}})
         return True
     return False
-
-
-async def ensure_otp_indexes():
-    """Create indexes for OTP collection"""
-    await otp_col.create_index("email")
-    await otp_col.create_index("expires_at", expireAfterSeconds=0)
\ No newline at end of file
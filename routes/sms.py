@@ -1,13 +1,30 @@
 # routes/sms.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from database import sms_messages_col
-from routes.notifications import process_message_and_notify
+from scoring_queue import enqueue_scoring, pending_verdict_fields
+from message_store import insert_new, SMS_KEY
+from body_store import offload_new, discard, load_fields
 from routes.auth import get_current_user
+from pagination import encode_cursor, after_cursor, bucket_filter, to_json_doc, ndjson_lines
 from pydantic import BaseModel
+from bson import ObjectId
+from bson.errors import InvalidId
+from typing import List, Optional
 from datetime import datetime
+import os
 
 router = APIRouter()
 
+SMS_BATCH_MAX_ITEMS = int(os.getenv("SMS_BATCH_MAX_ITEMS", "500"))
+SMS_PAGE_SIZE = int(os.getenv("SMS_PAGE_SIZE", "50"))
+SMS_PAGE_MAX = int(os.getenv("SMS_PAGE_MAX", "500"))
+
+# list view: everything but the large text fields
+SMS_LIST_PROJECTION = {"user_id": 0, "body": 0, "reasoning": 0, "highlighted_text": 0, "stored_fields": 0}
+SMS_FULL_PROJECTION = {"user_id": 0}
+SMS_SORT = [("date_ms", -1), ("_id", -1)]
+
 class DeviceSmsPayload(BaseModel):
     address: str
     body: str
@@ -15,73 +32,178 @@ class DeviceSmsPayload(BaseModel):
     type: str     # inbox / sent
 
 
+class DeviceSmsBatchPayload(BaseModel):
+    messages: List[DeviceSmsPayload]
+
+
+def _build_sms_doc(user_id: str, payload: DeviceSmsPayload) -> dict:
+    return {
+        "user_id": user_id,
+        "address": payload.address,
+        "body": payload.body,
+        "date_ms": payload.date_ms,
+        "type": payload.type,
+
+        # ML details, filled in by the scoring workers
+        **pending_verdict_fields(),
+
+        "saved_at": datetime.utcnow()
+    }
+
+
+def _sms_query(user_id: str, bucket: Optional[str], sender: Optional[str]) -> dict:
+    query = {"user_id": user_id}
+    if bucket:
+        query.update(bucket_filter("spam_score", bucket))
+    if sender:
+        query["address"] = sender
+    return query
+
+
 @router.get("/sms/all")
-async def get_all_sms(current_user: dict = Depends(get_current_user)):
-    """Return all SMS messages for the logged-in user."""
-    user_id = current_user.get("user_id")
-    msgs = await sms_messages_col.find({"user_id": user_id}).sort("date_ms", -1).to_list(None)
+async def get_all_sms(
+    limit: int = Query(SMS_PAGE_SIZE, ge=1, le=SMS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    view: str = Query("list", pattern="^(list|full)$"),
+    bucket: Optional[str] = None,
+    sender: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    One page of the user's SMS history, newest first.
+    Pass `next_cursor` back as `cursor` for the next page; it is null on the last one.
+    """
+    query = _sms_query(current_user.get("user_id"), bucket, sender)
+    if cursor:
+        query = {"$and": [query, after_cursor("date_ms", cursor)]}
+
+    projection = SMS_LIST_PROJECTION if view == "list" else SMS_FULL_PROJECTION
+    # one extra row tells us whether another page exists
+    msgs = await sms_messages_col.find(query, projection).sort(SMS_SORT).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(msgs) > limit:
+        msgs = msgs[:limit]
+        next_cursor = encode_cursor(msgs[-1]["date_ms"], msgs[-1]["_id"])
+    if view == "full":
+        await load_fields("sms", msgs)
+
+    return {
+        "count": len(msgs),
+        "sms_messages": [to_json_doc(m) for m in msgs],
+        "next_cursor": next_cursor
+    }
+
 
-    return {"count": len(msgs), "sms_messages": msgs}
+@router.get("/sms/export")
+async def export_sms(
+    bucket: Optional[str] = None,
+    sender: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """Full history as NDJSON (one message per line), streamed straight from the cursor."""
+    query = _sms_query(current_user.get("user_id"), bucket, sender)
+    cursor = sms_messages_col.find(query, SMS_FULL_PROJECTION).sort(SMS_SORT).batch_size(SMS_PAGE_MAX)
+    return StreamingResponse(
+        ndjson_lines(cursor, hydrate=lambda docs: load_fields("sms", docs)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="sms_export.ndjson"'}
+    )
 
 
 @router.post("/sms/save")
 async def save_sms(payload: DeviceSmsPayload, current_user: dict = Depends(get_current_user)):
     """
     Called by the device after reading SMS messages locally.
-    Runs ML inference + stores in DB + triggers push if required.
+    Stores the message as pending and queues it; the scoring workers fill in
+    the verdict and trigger the push. Poll /sms/verdict/{id} for the result.
     """
 
     user_id = current_user.get("user_id")
 
-    # Prevent duplicates using (user_id + timestamp + address)
-    existing = await sms_messages_col.find_one({
-        "user_id": user_id,
-        "address": payload.address,
-        "date_ms": payload.date_ms
-    })
-
-    if existing:
+    # Duplicates (same user + address + timestamp) are rejected by the unique index
+    docs = await offload_new("sms", [_build_sms_doc(user_id, payload)])
+    [(status, value)] = await insert_new(sms_messages_col, docs, SMS_KEY)
+    if status != "saved":
+        await discard("sms", [docs[0]["_id"]])
+    if status == "duplicate":
         return {"status": "duplicate_skipped"}
+    if status == "error":
+        raise HTTPException(status_code=500, detail="Failed to store message")
 
-    # ML Processing + conditional notification
-    result = await process_message_and_notify(
-        user_id=user_id,
-        message_text=payload.body,
-        sender=payload.address,
-        channel="sms"
-    )
-
-    # Store final record
-    sms_doc = {
-        "user_id": user_id,
-        "address": payload.address,
-        "body": payload.body,
-        "date_ms": payload.date_ms,
-        "type": payload.type,
-        
-        # ML scored details
-        "spam_score": result.get("score"),
-        "confidence": result.get("confidence"),
-        "reasoning": result.get("reasoning", ""),
-        "highlighted_text": result.get("highlighted_text", ""),
-        "final_decision": result.get("final_decision", ""),
-        "suggestion": result.get("suggestion", ""),
+    await enqueue_scoring("sms", user_id, [value])
 
-        "saved_at": datetime.utcnow()
+    return {
+        "status": "saved",
+        "id": str(value),
+        "verdict_status": "pending"
     }
 
-    await sms_messages_col.insert_one(sms_doc)
+
+@router.post("/sms/save-batch")
+async def save_sms_batch(payload: DeviceSmsBatchPayload, current_user: dict = Depends(get_current_user)):
+    """
+    Bulk variant of /sms/save for the device's initial inbox sync.
+    One unordered bulk upsert, one enqueue; returns a status per item.
+    """
+
+    items = payload.messages
+    if len(items) > SMS_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {SMS_BATCH_MAX_ITEMS} messages per batch")
+
+    user_id = current_user.get("user_id")
+
+    # One unordered bulk upsert; rows already stored and repeats inside the batch come back as duplicates
+    docs = await offload_new("sms", [_build_sms_doc(user_id, m) for m in items])
+    statuses, queued, orphaned = [], [], []
+    for doc, (status, value) in zip(docs, await insert_new(sms_messages_col, docs, SMS_KEY)):
+        if status == "saved":
+            statuses.append({"status": "saved", "id": str(value), "verdict_status": "pending"})
+            queued.append(value)
+            continue
+        orphaned.append(doc["_id"])
+        if status == "duplicate":
+            statuses.append({"status": "duplicate_skipped"})
+        else:
+            statuses.append({"status": "error", "detail": value})
+    await discard("sms", orphaned)
+
+    await enqueue_scoring("sms", user_id, queued)
 
     return {
-        "status": "saved",
-        "spam_score": sms_doc["spam_score"],
-        "final_decision": sms_doc["final_decision"]
+        "count": len(items),
+        "saved": sum(1 for st in statuses if st["status"] == "saved"),
+        "results": statuses
     }
 
 
+@router.get("/sms/verdict/{sms_id}")
+async def get_sms_verdict(sms_id: str, current_user: dict = Depends(get_current_user)):
+    """Poll the verdict of a message stored through /sms/save."""
+    try:
+        oid = ObjectId(sms_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid id")
+
+    doc = await sms_messages_col.find_one(
+        {"_id": oid, "user_id": current_user.get("user_id")},
+        {"body": 0, "user_id": 0}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Message not found")
+    await load_fields("sms", [doc], ("reasoning", "highlighted_text"))
+
+    doc["_id"] = str(doc["_id"])
+    # rows stored before the async pipeline are already scored
+    doc.setdefault("verdict_status", "scored")
+    return doc
+
+
 @router.delete("/sms/clear")
 async def clear_all_sms(current_user: dict = Depends(get_current_user)):
     """Developer utility: delete all SMS for this user."""
     user_id = current_user.get("user_id")
+    ids = await sms_messages_col.distinct("_id", {"user_id": user_id, "stored_fields.0": {"$exists": True}})
     await sms_messages_col.delete_many({"user_id": user_id})
+    await discard("sms", ids)
     return {"status": "cleared"}
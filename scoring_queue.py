@@ -0,0 +1,256 @@
+# scoring_queue.py
+import os
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+
+from database import scoring_jobs_col, sms_messages_col, messages_col
+from routes.notifications import score_message, trigger_notification
+from telemetry import Histogram
+from body_store import load_fields, update_fields
+from lease_queue import LeaseQueue
+from http_client import upstream_timeout
+from ml_resilience import ML_MAX_RETRIES
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "8"))
+# worst case for one message: every ML attempt times out, plus the (≤3s) backoffs between them
+_ML_DEADLINE = (ML_MAX_RETRIES + 1) * upstream_timeout("ml") + 3 * ML_MAX_RETRIES
+SCORING_LEASE_SECONDS = int(os.getenv("SCORING_LEASE_SECONDS", str(int(_ML_DEADLINE) + 30)))
+SCORING_MAX_ATTEMPTS = int(os.getenv("SCORING_MAX_ATTEMPTS", "5"))
+SCORING_POLL_SECONDS = float(os.getenv("SCORING_POLL_SECONDS", "1.0"))
+# re-queue messages left pending without a job (crash between insert and enqueue)
+SCORING_RECONCILE_SECONDS = float(os.getenv("SCORING_RECONCILE_SECONDS", "300"))
+SCORING_RECONCILE_GRACE = int(os.getenv("SCORING_RECONCILE_GRACE", "120"))
+SCORING_RECONCILE_BATCH = int(os.getenv("SCORING_RECONCILE_BATCH", "500"))
+
+# channel → (collection holding the message, field holding the sender)
+TARGETS = {
+    "sms": (sms_messages_col, "address"),
+    "email": (messages_col, "from_email"),
+}
+
+_queue = LeaseQueue(
+    "Scoring job", scoring_jobs_col,
+    lease_seconds=SCORING_LEASE_SECONDS, poll_seconds=SCORING_POLL_SECONDS,
+)
+_reconciler = None
+_counters = {"enqueued": 0, "scored": 0, "unscored": 0, "retried": 0, "failed": 0,
+             "lease_lost": 0, "reconciled": 0}
+_job_age_hist = Histogram([0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300])   # seconds, enqueue → scored
+
+
+def pending_verdict_fields() -> dict:
+    """Verdict fields for a message that has been stored but not scored yet."""
+    return {
+        "verdict_status": "pending",
+        "spam_score": None,
+        "confidence": None,
+        "reasoning": "",
+        "highlighted_text": "",
+        "final_decision": "",
+        "suggestion": "",
+    }
+
+
+def verdict_fields(result: dict) -> dict:
+    return {
+        "verdict_status": "scored",
+        "spam_score": result.get("score"),
+        "confidence": result.get("confidence"),
+        "reasoning": result.get("reasoning", ""),
+        "highlighted_text": result.get("highlighted_text", ""),
+        "final_decision": result.get("final_decision", ""),
+        "suggestion": result.get("suggestion", ""),
+        "verdict_source": result.get("verdict_source", "model"),
+        "sender_reputation": result.get("sender_reputation"),
+        "scored_at": datetime.utcnow(),
+    }
+
+
+# ----------------------------
+# Producer side
+# ----------------------------
+async def enqueue_scoring(channel: str, user_id: str, doc_ids: list, notify: bool = True):
+    """
+    Queue stored messages for scoring. Jobs live in Mongo so they survive restarts.
+    A message has at most one job (unique index): queuing it again is a no-op.
+    notify=False scores without a push (imported history, not newly arrived mail).
+    """
+    if not doc_ids:
+        return
+
+    now = datetime.utcnow()
+    try:
+        await scoring_jobs_col.insert_many([
+            {
+                "channel": channel,
+                "doc_id": doc_id,
+                "user_id": user_id,
+                "notify": notify,
+                "status": "queued",
+                "attempts": 0,
+                "created_at": now,
+                "run_after": now,
+            }
+            for doc_id in doc_ids
+        ], ordered=False)
+        queued = len(doc_ids)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        queued = e.details.get("nInserted", 0)
+    _counters["enqueued"] += queued
+    _queue.wake()
+
+
+# ----------------------------
+# Consumer side
+# ----------------------------
+async def _retry_or_fail(job: dict, worker_id: str, error: str):
+    col, _ = TARGETS[job["channel"]]
+    backoff = min(300, 2 ** job["attempts"])
+    if await _queue.retry_or_fail(job, worker_id, error, SCORING_MAX_ATTEMPTS, backoff):
+        _counters["failed"] += 1
+        await col.update_one({"_id": job["doc_id"]}, {"$set": {"verdict_status": "failed"}})
+    else:
+        _counters["retried"] += 1
+
+
+async def _requeue_unscored(job: dict, worker_id: str):
+    # An outage is not the job's fault, so it does not use up attempts
+    unscored = job.get("unscored_attempts", 0) + 1
+    _counters["unscored"] += 1
+    await scoring_jobs_col.update_one(
+        _queue.guard(job, worker_id),
+        {
+            "$set": {
+                "status": "queued",
+                "run_after": datetime.utcnow() + timedelta(seconds=min(600, 5 * 2 ** unscored)),
+            },
+            "$inc": {"attempts": -1, "unscored_attempts": 1},
+        }
+    )
+
+
+async def _process(job: dict, worker_id: str):
+    col, sender_field = TARGETS[job["channel"]]
+    doc = await col.find_one({"_id": job["doc_id"]})
+    if not doc:
+        # message deleted before it was scored
+        await scoring_jobs_col.delete_one(_queue.guard(job, worker_id))
+        return
+
+    await load_fields(job["channel"], [doc], ("body",))
+    sender = doc.get(sender_field, "")
+    result = await score_message(doc.get("body", ""), sender, job["channel"], job["user_id"])
+
+    if result.get("verdict_status") == "unscored":
+        # ML is down: say so on the message and try again later instead of storing a fake score
+        await col.update_one({"_id": doc["_id"]}, {"$set": {"verdict_status": "unscored"}})
+        await _requeue_unscored(job, worker_id)
+        return
+
+    # long reasoning / highlights go to the body store like the body itself
+    await update_fields(job["channel"], doc["_id"], verdict_fields(result))
+
+    # Completing the job needs the lease: if another worker took it over, that
+    # worker stores the (same) verdict and sends the one push
+    done = await scoring_jobs_col.delete_one(_queue.guard(job, worker_id))
+    if not done.deleted_count:
+        _counters["lease_lost"] += 1
+        return
+    _counters["scored"] += 1
+    _job_age_hist.observe((datetime.utcnow() - job["created_at"]).total_seconds())
+
+    if not job.get("notify", True):
+        return
+
+    # The verdict is stored; a push failure must not re-run scoring
+    try:
+        await trigger_notification(job["user_id"], job["channel"], sender, result.get("score"))
+    except Exception as e:
+        print(f"❌ Notification failed: {e}")
+
+
+# ----------------------------
+# Reconciliation
+# ----------------------------
+async def reconcile_pending() -> int:
+    """Queue messages still pending after the grace period that have no job (lost between insert and enqueue)."""
+    cutoff = ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=SCORING_RECONCILE_GRACE))
+    requeued = 0
+    for channel, (col, _) in TARGETS.items():
+        pending = await col.find(
+            {"verdict_status": "pending", "_id": {"$lt": cutoff}},
+            {"user_id": 1}
+        ).limit(SCORING_RECONCILE_BATCH).to_list(None)
+        if not pending:
+            continue
+
+        queued = await scoring_jobs_col.distinct("doc_id", {"doc_id": {"$in": [d["_id"] for d in pending]}})
+        by_user = {}
+        for doc in pending:
+            if doc["_id"] not in queued:
+                by_user.setdefault(doc["user_id"], []).append(doc["_id"])
+        for user_id, doc_ids in by_user.items():
+            await enqueue_scoring(channel, user_id, doc_ids)
+            requeued += len(doc_ids)
+
+    _counters["reconciled"] += requeued
+    return requeued
+
+
+async def _reconcile_loop():
+    while True:
+        await asyncio.sleep(SCORING_RECONCILE_SECONDS)
+        try:
+            requeued = await reconcile_pending()
+            if requeued:
+                print(f"⚠ Re-queued {requeued} pending messages without a scoring job")
+        except Exception as e:
+            print(f"❌ Scoring reconciliation failed: {e}")
+
+
+async def start_scoring_workers(count: int = SCORING_WORKERS):
+    global _reconciler
+    await _queue.start(count, _process, on_error=_retry_or_fail)
+    if _reconciler is None:
+        _reconciler = asyncio.create_task(_reconcile_loop())
+
+
+async def stop_scoring_workers():
+    global _reconciler
+    if _reconciler is not None:
+        _reconciler.cancel()
+        await asyncio.gather(_reconciler, return_exceptions=True)
+        _reconciler = None
+    await _queue.stop()
+
+
+# ----------------------------
+# Observability
+# ----------------------------
+async def scoring_queue_stats() -> dict:
+    depth = await _queue.depth()
+    oldest = await scoring_jobs_col.find_one(
+        {"status": {"$in": ["queued", "leased"]}},
+        {"created_at": 1},
+        sort=[("created_at", 1)]
+    )
+    oldest_age = (datetime.utcnow() - oldest["created_at"]).total_seconds() if oldest else 0.0
+
+    return {
+        "depth": depth,
+        "oldest_job_age_seconds": round(oldest_age, 3),
+        "workers": len(_queue.workers),
+        "counters": dict(_counters),
+        "job_age_seconds": _job_age_hist.snapshot(),
+    }
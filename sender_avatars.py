@@ -0,0 +1,80 @@
+# sender_avatars.py
+import os
+import hashlib
+
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from database import avatars_col
+
+load_dotenv()
+
+SENDER_CACHE_SIZE = int(os.getenv("SENDER_CACHE_SIZE", "50000"))
+
+COLOR_PALETTE = [
+    "#4285F4", "#EA4335", "#FBBC05", "#34A853", "#9C27B0", "#00ACC1", "#7E57C2",
+    "#FF7043", "#F06292", "#4DB6AC", "#1A237E", "#B71C1C", "#1B5E20", "#0D47A1",
+    "#F57F17", "#880E4F", "#004D40", "#311B92", "#BF360C", "#33691E", "#C62828",
+    "#283593", "#00695C", "#4527A0", "#E64A19", "#1976D2", "#AD1457", "#00838F",
+    "#5D4037", "#455A64"
+]
+
+# sender → color stored in avatars_col (older rows hold randomly picked colors, kept as overrides)
+_profiles = LRUCache(maxsize=SENDER_CACHE_SIZE)
+_counters = {"cache_hits": 0, "db_lookups": 0, "new_senders": 0}
+
+
+def sender_color(sender: str) -> str:
+    """Same sender → same color on every worker, without a database round trip."""
+    digest = hashlib.blake2b((sender or "").strip().lower().encode("utf-8"), digest_size=4).digest()
+    return COLOR_PALETTE[int.from_bytes(digest, "big") % len(COLOR_PALETTE)]
+
+
+async def resolve_sender_colors(senders: list) -> dict:
+    """
+    Colors for a whole sync batch: LRU first, then one $in lookup for the rest,
+    then one bulk upsert registering the senders seen for the first time.
+    """
+    colors, misses = {}, []
+    for sender in dict.fromkeys(senders):
+        cached = _profiles.get(sender)
+        if cached is not None:
+            _counters["cache_hits"] += 1
+            colors[sender] = cached
+        else:
+            misses.append(sender)
+
+    if not misses:
+        return colors
+
+    _counters["db_lookups"] += 1
+    try:
+        async for doc in avatars_col.find({"email": {"$in": misses}}, {"email": 1, "char_color": 1, "_id": 0}):
+            if doc.get("char_color"):
+                colors[doc["email"]] = _profiles[doc["email"]] = doc["char_color"]
+    except Exception as e:
+        # colors are cosmetic: fall back to the derived ones
+        print(f"❌ Sender avatar lookup failed: {e}")
+        return {**{s: sender_color(s) for s in misses}, **colors}
+
+    new_senders = [s for s in misses if s not in colors]
+    for sender in new_senders:
+        colors[sender] = _profiles[sender] = sender_color(sender)
+
+    if new_senders:
+        _counters["new_senders"] += len(new_senders)
+        try:
+            # $setOnInsert: a row another worker wrote meanwhile wins
+            await avatars_col.bulk_write([
+                UpdateOne({"email": s}, {"$setOnInsert": {"char_color": colors[s]}}, upsert=True)
+                for s in new_senders
+            ], ordered=False)
+        except Exception as e:
+            print(f"❌ Sender avatar upsert failed: {e}")
+
+    return colors
+
+
+def sender_cache_stats() -> dict:
+    return {"cached": len(_profiles), "max_size": SENDER_CACHE_SIZE, **_counters}
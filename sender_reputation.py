@@ -0,0 +1,158 @@
+# sender_reputation.py
+import os
+import random
+import asyncio
+from datetime import datetime
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from database import sender_reputation_col, sms_messages_col, messages_col
+from prefilter import extract_urls
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+REPUTATION_ENABLED = os.getenv("REPUTATION_ENABLED", "true").lower() in ("1", "true", "yes")
+REPUTATION_MIN_COUNT = int(os.getenv("REPUTATION_MIN_COUNT", "20"))
+REPUTATION_BENIGN_MAX_MEAN = float(os.getenv("REPUTATION_BENIGN_MAX_MEAN", "10"))
+REPUTATION_BENIGN_MAX_PEAK = float(os.getenv("REPUTATION_BENIGN_MAX_PEAK", "25"))
+REPUTATION_MALICIOUS_MIN_MEAN = float(os.getenv("REPUTATION_MALICIOUS_MIN_MEAN", "85"))
+# Share of fast-path candidates still sent to the model so reputations keep tracking reality
+REPUTATION_SAMPLE_RATE = float(os.getenv("REPUTATION_SAMPLE_RATE", "0.05"))
+REPUTATION_CACHE_SIZE = int(os.getenv("REPUTATION_CACHE_SIZE", "50000"))
+REPUTATION_CACHE_TTL = int(os.getenv("REPUTATION_CACHE_TTL", "300"))
+
+_cache = TTLCache(maxsize=REPUTATION_CACHE_SIZE, ttl=REPUTATION_CACHE_TTL)
+_counters = {"lookups": 0, "cache_hits": 0, "fast_benign": 0, "fast_malicious": 0, "sampled": 0, "updates": 0}
+
+# channel → (collection, sender field) for rebuilds
+SOURCES = {
+    "sms": (sms_messages_col, "address"),
+    "email": (messages_col, "from_email"),
+}
+
+
+def _key(channel: str, user_id: str, sender: str) -> str:
+    # per user: senders are self-reported by clients (/sms/save), so one account
+    # must not be able to vouch for (or smear) a sender in everyone else's inbox
+    return f"{channel}:{user_id}:{(sender or '').strip().lower()}"
+
+
+def summarize(doc: dict) -> dict:
+    count = doc.get("count", 0)
+    return {
+        "count": count,
+        "mean_score": round(doc.get("score_sum", 0) / count, 2) if count else None,
+        "max_score": doc.get("max_score"),
+        "last_seen": doc.get("last_seen"),
+    }
+
+
+async def get_reputation(channel: str, user_id: str, sender: str):
+    """Summary of a sender in this user's history, or None if it has none. Cached in-process."""
+    if not REPUTATION_ENABLED or not sender or not user_id:
+        return None
+
+    _counters["lookups"] += 1
+    key = _key(channel, user_id, sender)
+    if key in _cache:
+        _counters["cache_hits"] += 1
+        return _cache[key]
+
+    doc = await sender_reputation_col.find_one({"_id": key})
+    summary = summarize(doc) if doc else None
+    _cache[key] = summary     # unknown senders are cached too
+    return summary
+
+
+async def record_score(channel: str, user_id: str, sender: str, score):
+    """Fold one model score into the sender's running stats for this user."""
+    if not REPUTATION_ENABLED or not sender or not user_id or score is None:
+        return
+
+    key = _key(channel, user_id, sender)
+    await sender_reputation_col.update_one(
+        {"_id": key},
+        {
+            "$inc": {"count": 1, "score_sum": float(score)},
+            "$max": {"max_score": float(score)},
+            "$set": {"channel": channel, "user_id": user_id, "sender": sender.strip().lower(),
+                     "last_seen": datetime.utcnow()},
+        },
+        upsert=True
+    )
+    _cache.pop(key, None)
+    _counters["updates"] += 1
+
+
+def fast_path(reputation: dict, text: str):
+    """Verdict for a well-known sender without asking the model, or None."""
+    if not reputation or reputation["count"] < REPUTATION_MIN_COUNT:
+        return None
+
+    mean, peak = reputation["mean_score"], reputation["max_score"]
+    if mean >= REPUTATION_MALICIOUS_MIN_MEAN:
+        verdict = "malicious"
+    elif mean <= REPUTATION_BENIGN_MAX_MEAN and peak <= REPUTATION_BENIGN_MAX_PEAK and not extract_urls(text):
+        # a link from a "safe" sender is exactly what a compromised account sends, so let the model see it
+        verdict = "benign"
+    else:
+        return None
+
+    if random.random() < REPUTATION_SAMPLE_RATE:
+        _counters["sampled"] += 1
+        return None
+
+    _counters["fast_" + verdict] += 1
+    score = round(mean)
+    return {
+        "score": score,
+        "confidence": 1 if verdict == "malicious" else 0,
+        "reasoning": (
+            f"Sender has {reputation['count']} previous messages with a mean risk score of "
+            f"{reputation['mean_score']} (max {reputation['max_score']})"
+        ),
+        "highlighted_text": "",
+        "final_decision": "Critical" if verdict == "malicious" else "Secure",
+        "suggestion": "This sender is repeatedly flagged. Do not engage." if verdict == "malicious" else "",
+        "verdict_source": "reputation",
+    }
+
+
+def reputation_stats() -> dict:
+    return {**_counters, "cache_size": len(_cache), "enabled": REPUTATION_ENABLED}
+
+
+async def rebuild_sender_reputation():
+    """Recompute every (user, sender) stats from the stored message history."""
+    # rows keyed the old, global way (channel:sender) are no longer read
+    await sender_reputation_col.delete_many({"user_id": {"$exists": False}})
+    for channel, (col, sender_field) in SOURCES.items():
+        await col.aggregate([
+            {"$match": {
+                "user_id": {"$type": "string", "$ne": ""},
+                sender_field: {"$type": "string", "$ne": ""},
+                "spam_score": {"$type": "number"},
+            }},
+            {"$group": {
+                "_id": {"$concat": [channel, ":", "$user_id", ":", {"$toLower": {"$trim": {"input": f"${sender_field}"}}}]},
+                "user_id": {"$first": "$user_id"},
+                "sender": {"$first": {"$toLower": {"$trim": {"input": f"${sender_field}"}}}},
+                "count": {"$sum": 1},
+                "score_sum": {"$sum": "$spam_score"},
+                "max_score": {"$max": "$spam_score"},
+            }},
+            {"$set": {"channel": channel, "last_seen": "$$NOW"}},
+            {"$merge": {"into": {"db": sender_reputation_col.database.name, "coll": sender_reputation_col.name},
+                        "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]).to_list(None)
+        print(f"✅ Sender reputation rebuilt for {channel}")
+    _cache.clear()
+
+
+if __name__ == "__main__":
+    # python sender_reputation.py  → one-off backfill from existing history
+    asyncio.run(rebuild_sender_reputation())
@@ -0,0 +1,187 @@
+# sync_scheduler.py
+import os
+import random
+import asyncio
+import weakref
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from database import accounts_col
+from gmail_sync import sync_linked_account
+from lease_queue import LeaseQueue
+from telemetry import Histogram
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+SYNC_SCHEDULER_ENABLED = os.getenv("SYNC_SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "20"))                 # per process
+SYNC_PER_USER_CONCURRENCY = int(os.getenv("SYNC_PER_USER_CONCURRENCY", "2"))
+SYNC_MIN_INTERVAL = float(os.getenv("SYNC_MIN_INTERVAL", "60"))             # seconds, busy mailbox
+SYNC_MAX_INTERVAL = float(os.getenv("SYNC_MAX_INTERVAL", "1800"))           # seconds, idle mailbox
+SYNC_JITTER = float(os.getenv("SYNC_JITTER", "0.2"))                        # ±20% so accounts spread out
+SYNC_LEASE_SECONDS = int(os.getenv("SYNC_LEASE_SECONDS", "300"))
+SYNC_POLL_SECONDS = float(os.getenv("SYNC_POLL_SECONDS", "5"))
+
+_syncing: set = set()      # account ids being synced by this process
+_user_semaphores = weakref.WeakValueDictionary()
+_counters = {"claimed": 0, "synced": 0, "errors": 0, "added": 0}
+_lag_hist = Histogram([1, 5, 15, 30, 60, 120, 300, 900, 1800, 3600])   # seconds past next_sync_at when claimed
+
+
+def next_interval(account: dict, added: int) -> float:
+    """Halve the interval when mail arrived, grow it by half when the mailbox was quiet."""
+    # a live push watch delivers new mail already; polling is only a safety net
+    watch = account.get("watch_expiration")
+    if watch and watch > datetime.utcnow():
+        return SYNC_MAX_INTERVAL
+
+    interval = account.get("sync_interval") or SYNC_MIN_INTERVAL
+    interval = interval / 2 if added else interval * 1.5
+    return min(SYNC_MAX_INTERVAL, max(SYNC_MIN_INTERVAL, interval))
+
+
+def _jittered(seconds: float) -> float:
+    return seconds * random.uniform(1 - SYNC_JITTER, 1 + SYNC_JITTER)
+
+
+# ----------------------------
+# Leasing (several API workers / scheduler processes share the accounts)
+# ----------------------------
+def _due(now: datetime) -> dict:
+    return {
+        "refresh_token": {"$exists": True},
+        "$and": [
+            {"$or": [{"next_sync_at": {"$lte": now}}, {"next_sync_at": {"$exists": False}}]},
+            # no lease, or the worker holding it died mid-sync
+            {"$or": [{"sync_lease_until": {"$lt": now}}, {"sync_lease_until": {"$exists": False}}]},
+        ],
+    }
+
+
+# the lease is renewed while a sync runs, so a long full resync is never synced twice
+_queue = LeaseQueue(
+    "Scheduled sync", accounts_col,
+    lease_seconds=SYNC_LEASE_SECONDS, poll_seconds=SYNC_POLL_SECONDS,
+    ready=_due, claimed=None, sort=[("next_sync_at", 1)],
+    owner_field="sync_lease_owner", until_field="sync_lease_until",
+)
+
+
+async def _release(account: dict, worker_id: str, interval: float, fields: dict):
+    await accounts_col.update_one(
+        _queue.guard(account, worker_id),
+        {
+            "$set": {
+                "sync_interval": interval,
+                "next_sync_at": datetime.utcnow() + timedelta(seconds=_jittered(interval)),
+                **fields,
+            },
+            "$unset": {"sync_lease_owner": "", "sync_lease_until": ""},
+        }
+    )
+
+
+async def _run(account: dict, worker_id: str):
+    _counters["claimed"] += 1
+    if account.get("next_sync_at"):
+        _lag_hist.observe(max(0.0, (datetime.utcnow() - account["next_sync_at"]).total_seconds()))
+
+    user_sem = _user_semaphores.get(account["user_id"])
+    if user_sem is None:
+        user_sem = asyncio.Semaphore(SYNC_PER_USER_CONCURRENCY)
+        _user_semaphores[account["user_id"]] = user_sem
+
+    async with user_sem:
+        _syncing.add(account["_id"])
+        try:
+            result = await sync_linked_account(account)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _counters["errors"] += 1
+            print(f"❌ Scheduled sync failed for {account.get('gmail_email')}: {e}")
+            # back off like an idle mailbox would, twice over
+            interval = min(SYNC_MAX_INTERVAL, 2 * (account.get("sync_interval") or SYNC_MIN_INTERVAL))
+            await _release(account, worker_id, interval, {"last_sync_error": str(e)[:300]})
+            return
+        finally:
+            _syncing.discard(account["_id"])
+
+    _counters["synced"] += 1
+    _counters["added"] += result["added"]
+    await _release(
+        account, worker_id, next_interval(account, result["added"]),
+        {"last_sync_added": result["added"], "last_sync_error": None}
+    )
+
+
+async def start_sync_scheduler(force: bool = False):
+    # SYNC_CONCURRENCY workers, each syncing one claimed account at a time
+    if SYNC_SCHEDULER_ENABLED or force:
+        await _queue.start(SYNC_CONCURRENCY, _run, suffix=":sync")
+
+
+async def stop_sync_scheduler():
+    await _queue.stop()
+
+
+# ----------------------------
+# Observability
+# ----------------------------
+async def sync_lag(limit: int = 100) -> dict:
+    """Per-account lag: seconds since the last sync and seconds overdue, stalest first."""
+    now = datetime.utcnow()
+    rows = await accounts_col.find(
+        {"refresh_token": {"$exists": True}},
+        {"user_id": 1, "gmail_email": 1, "last_synced_at": 1, "next_sync_at": 1,
+         "sync_interval": 1, "last_sync_error": 1, "sync_lease_until": 1},
+    ).sort("last_synced_at", 1).limit(limit).to_list(None)
+
+    accounts = []
+    for row in rows:
+        last = row.get("last_synced_at")
+        due = row.get("next_sync_at")
+        accounts.append({
+            "user_id": row.get("user_id"),
+            "gmail_email": row.get("gmail_email"),
+            "lag_seconds": round((now - last).total_seconds(), 1) if last else None,
+            "overdue_seconds": round(max(0.0, (now - due).total_seconds()), 1) if due else None,
+            "interval_seconds": row.get("sync_interval"),
+            "syncing": bool(row.get("sync_lease_until") and row["sync_lease_until"] > now),
+            "last_error": row.get("last_sync_error"),
+        })
+    return {"accounts": accounts}
+
+
+def scheduler_stats() -> dict:
+    return {
+        "enabled": bool(_queue.workers),
+        "in_flight": len(_syncing),
+        "counters": dict(_counters),
+        "claim_lag_seconds": _lag_hist.snapshot(),
+    }
+
+
+async def _main():
+    from http_client import start_http_clients, close_http_clients
+
+    await start_http_clients()
+    await start_sync_scheduler(force=True)
+    print("✅ Sync scheduler running (Ctrl+C to stop)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_sync_scheduler()
+        await close_http_clients()
+
+
+if __name__ == "__main__":
+    # Standalone worker: syncs accounts and enqueues scoring jobs; the API workers score them
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,173 @@
+# tests/test_gmail_client.py
+import json
+import asyncio
+
+import httpx
+import pytest
+
+import gmail_client
+import http_client
+from gmail_client import (
+    GmailApiError, _MultipartHttpParser, _batch_boundary, _post_batch, batch_get_messages,
+)
+
+BOUNDARY = "batch_abc123"
+
+
+def _part(content_id: str, status: int, body: str, reason: str = "OK") -> str:
+    return (
+        f"--{BOUNDARY}\r\n"
+        "Content-Type: application/http\r\n"
+        f"Content-ID: <{content_id}>\r\n\r\n"
+        f"HTTP/1.1 {status} {reason}\r\n"
+        "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+        f"{body}\r\n"
+    )
+
+
+def _batch_response(*parts: str) -> httpx.Response:
+    return httpx.Response(
+        200,
+        headers={"Content-Type": f"multipart/mixed; boundary={BOUNDARY}"},
+        content="".join(parts) + f"--{BOUNDARY}--\r\n",
+    )
+
+
+def _feed_all(text: str) -> list:
+    parser = _MultipartHttpParser(BOUNDARY)
+    parts = []
+    for line in text.split("\r\n"):
+        part = parser.feed(line)
+        if part:
+            parts.append(part)
+    return parts
+
+
+def _with_transport(handler, coro_factory):
+    """Run coro_factory() with every upstream client routed to `handler`."""
+    async def run():
+        http_client.use_transport(httpx.MockTransport(handler))
+        try:
+            return await coro_factory()
+        finally:
+            await http_client.close_http_clients()
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(gmail_client, "_backoff", lambda attempt, retry_after=None: 0)
+
+
+# ----------------------------
+# _MultipartHttpParser
+# ----------------------------
+def test_parser_yields_each_part():
+    text = (
+        "preamble ignored\r\n"
+        + _part("response-a", 200, '{"id": "a"}')
+        + _part("response-b", 200, '{"id": "b"}')
+        + f"--{BOUNDARY}--\r\n"
+    )
+    parts = _feed_all(text)
+    assert [(cid, status) for cid, status, _ in parts] == [("response-a", 200), ("response-b", 200)]
+    assert json.loads(parts[0][2]) == {"id": "a"}
+
+
+def test_parser_keeps_multiline_bodies():
+    parts = _feed_all(_part("response-a", 200, '{\r\n  "id": "a"\r\n}') + f"--{BOUNDARY}--")
+    assert json.loads(parts[0][2]) == {"id": "a"}
+
+
+def test_parser_reports_non_200_status():
+    parts = _feed_all(_part("response-a", 404, '{"error": {}}', "Not Found") + f"--{BOUNDARY}--")
+    assert parts[0][:2] == ("response-a", 404)
+
+
+def test_parser_ignores_lines_after_closing_delimiter():
+    parser = _MultipartHttpParser(BOUNDARY)
+    for line in (_part("response-a", 200, "{}") + f"--{BOUNDARY}--\r\n").split("\r\n"):
+        parser.feed(line)
+    assert parser.state == "done"
+    assert parser.feed("HTTP/1.1 200 OK") is None
+    assert parser.feed(f"--{BOUNDARY}--") is None
+
+
+def test_parser_drops_part_without_status_line():
+    text = f"--{BOUNDARY}\r\nContent-ID: <response-a>\r\n\r\n--{BOUNDARY}--"
+    assert _feed_all(text) == []
+
+
+# ----------------------------
+# _batch_boundary
+# ----------------------------
+def test_batch_boundary_plain_and_quoted():
+    assert _batch_boundary("multipart/mixed; boundary=batch_x") == "batch_x"
+    assert _batch_boundary('multipart/mixed; charset=UTF-8; Boundary="batch_y"') == "batch_y"
+
+
+def test_batch_boundary_missing():
+    with pytest.raises(GmailApiError) as exc:
+        _batch_boundary("multipart/mixed")
+    assert exc.value.status_code == 502
+
+
+# ----------------------------
+# _post_batch / batch_get_messages
+# ----------------------------
+def test_post_batch_strips_response_prefix_and_skips_failed_parts():
+    def handler(request):
+        assert request.url.path == "/batch/gmail/v1"
+        assert "Content-ID: <a>" in request.content.decode()
+        return _batch_response(
+            _part("response-a", 200, '{"id": "a"}'),
+            _part("response-b", 404, '{"error": {"code": 404}}', "Not Found"),
+            _part("response-c", 200, "not json"),
+        )
+
+    found = _with_transport(handler, lambda: _post_batch("token", ["a", "b", "c"], "acct", "full"))
+    assert found == {"a": {"id": "a"}}
+
+
+def test_post_batch_retries_server_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, text="unavailable")
+        return _batch_response(_part("response-a", 200, '{"id": "a"}'))
+
+    found = _with_transport(handler, lambda: _post_batch("token", ["a"], "acct", "full"))
+    assert found == {"a": {"id": "a"}}
+    assert len(calls) == 2
+
+
+def test_post_batch_raises_on_client_error():
+    def handler(request):
+        return httpx.Response(401, text="invalid credentials")
+
+    with pytest.raises(GmailApiError) as exc:
+        _with_transport(handler, lambda: _post_batch("token", ["a"], "acct", "full"))
+    assert exc.value.status_code == 401
+
+
+def test_batch_get_messages_falls_back_to_single_gets():
+    def handler(request):
+        path = request.url.path
+        if path == "/batch/gmail/v1":
+            return _batch_response(
+                _part("response-a", 200, '{"id": "a"}'),
+                _part("response-b", 500, "{}", "Internal Server Error"),
+                _part("response-c", 404, "{}", "Not Found"),
+            )
+        if path.endswith("/messages/b"):
+            return httpx.Response(200, json={"id": "b"})
+        return httpx.Response(404, json={"error": {"code": 404}})
+
+    messages, errors = _with_transport(
+        handler, lambda: batch_get_messages("token", ["a", "b", "c", "a"], "acct")
+    )
+    assert messages == {"a": {"id": "a"}, "b": {"id": "b"}}
+    assert list(errors) == ["c"]
+    assert errors["c"].status_code == 404
@@ -0,0 +1,170 @@
+# tests/test_mime_parser.py
+import base64
+
+import mime_parser
+from mime_parser import parse_payload, payload_size, html_to_text
+
+
+def _b64(data) -> str:
+    raw = data.encode("utf-8") if isinstance(data, str) else data
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _text(mime_type: str, data, charset: str = None) -> dict:
+    part = {"mimeType": mime_type, "body": {"data": _b64(data), "size": len(data)}}
+    if charset:
+        part["headers"] = [{"name": "Content-Type", "value": f'{mime_type}; charset="{charset}"'}]
+    return part
+
+
+def _multipart(*parts, mime_type: str = "multipart/alternative") -> dict:
+    return {"mimeType": mime_type, "parts": list(parts)}
+
+
+# ----------------------------
+# Body selection
+# ----------------------------
+def test_plain_wins_over_html():
+    result = parse_payload(_multipart(
+        _text("text/plain", "  Plain body  "),
+        _text("text/html", "<p>HTML body</p>"),
+    ))
+    assert result["body"] == "Plain body"
+    assert result["body_format"] == "plain"
+
+
+def test_html_used_when_plain_is_blank():
+    result = parse_payload(_multipart(
+        _text("text/plain", "   "),
+        _text("text/html", "<html><head><title>x</title></head><body><p>Hello</p><script>evil()</script>"
+                           "<p>World &amp; co</p></body></html>"),
+    ))
+    assert result["body_format"] == "html"
+    assert result["body"] == "Hello\nWorld & co"
+
+
+def test_nested_parts_in_document_order():
+    result = parse_payload(_multipart(
+        _multipart(_text("text/plain", "first"), mime_type="multipart/alternative"),
+        _text("text/plain", "second"),
+        mime_type="multipart/mixed",
+    ))
+    assert result["body"] == "first"
+
+
+def test_empty_payload():
+    assert parse_payload({}) == {"body": "", "body_format": "", "urls": [], "attachments": []}
+    assert parse_payload(None)["body"] == ""
+
+
+def test_url_safe_base64_without_padding():
+    # encodes to "Pz8-Pg": url-safe alphabet, padding stripped
+    assert parse_payload(_text("text/plain", "??>>"))["body"] == "??>>"
+
+
+def test_invalid_base64_gives_empty_body():
+    part = {"mimeType": "text/plain", "body": {"data": "!!!!"}}
+    assert parse_payload(part)["body"] == ""
+
+
+# ----------------------------
+# Charsets
+# ----------------------------
+def test_declared_charset_is_used():
+    part = _text("text/plain", "café".encode("latin-1"), charset="ISO-8859-1")
+    assert parse_payload(part)["body"] == "café"
+
+
+def test_unknown_charset_falls_back_to_utf8():
+    part = _text("text/plain", "café", charset="x-no-such-charset")
+    assert parse_payload(part)["body"] == "café"
+
+
+def test_undecodable_bytes_are_replaced():
+    part = _text("text/plain", b"ok \xff\xfe")
+    assert parse_payload(part)["body"] == "ok ��"
+
+
+# ----------------------------
+# Attachments
+# ----------------------------
+def test_attachments_are_listed_not_decoded():
+    result = parse_payload(_multipart(
+        _text("text/plain", "see attached"),
+        {"mimeType": "application/pdf", "filename": "invoice.pdf",
+         "body": {"attachmentId": "att-1", "size": 1234}},
+        {"mimeType": "text/plain", "filename": "notes.txt",
+         "body": {"data": _b64("attachment text"), "size": 15}},
+        mime_type="multipart/mixed",
+    ))
+    assert result["body"] == "see attached"
+    assert result["attachments"] == [
+        {"filename": "invoice.pdf", "mime_type": "application/pdf", "size": 1234, "attachment_id": "att-1"},
+        {"filename": "notes.txt", "mime_type": "text/plain", "size": 15, "attachment_id": None},
+    ]
+
+
+def test_payload_size_skips_attachments():
+    inline = _text("text/plain", "x" * 30)
+    payload = _multipart(inline, {"mimeType": "image/png", "filename": "a.png",
+                                  "body": {"data": _b64("y" * 300)}})
+    assert payload_size(payload) == len(inline["body"]["data"])
+
+
+# ----------------------------
+# URLs
+# ----------------------------
+def test_urls_from_href_and_text_deduplicated():
+    result = parse_payload(_text(
+        "text/html",
+        '<a href="https://evil.example/login">Click</a> or visit https://evil.example/login. '
+        "Also http://other.example/path, thanks",
+    ))
+    assert result["urls"] == ["https://evil.example/login", "http://other.example/path"]
+
+
+def test_url_cap(monkeypatch):
+    monkeypatch.setattr(mime_parser, "MIME_MAX_URLS", 3)
+    body = " ".join(f"https://site{i}.example/" for i in range(10))
+    assert parse_payload(_text("text/plain", body))["urls"] == [
+        "https://site0.example/", "https://site1.example/", "https://site2.example/",
+    ]
+
+
+# ----------------------------
+# Caps
+# ----------------------------
+def test_part_byte_cap(monkeypatch):
+    monkeypatch.setattr(mime_parser, "MIME_MAX_PART_BYTES", 10)
+    assert parse_payload(_text("text/plain", "0123456789abcdef"))["body"] == "0123456789"
+
+
+def test_part_byte_cap_splitting_a_character(monkeypatch):
+    monkeypatch.setattr(mime_parser, "MIME_MAX_PART_BYTES", 4)
+    # "é" is two bytes; the cut lands inside the second one
+    assert parse_payload(_text("text/plain", "abcé"))["body"] == "abc�"
+
+
+def test_body_char_cap(monkeypatch):
+    monkeypatch.setattr(mime_parser, "MIME_MAX_BODY_CHARS", 5)
+    result = parse_payload(_text("text/plain", "hello world https://late.example/"))
+    assert result["body"] == "hello"
+    # URLs are taken from the capped text only
+    assert result["urls"] == []
+
+
+def test_part_count_cap(monkeypatch):
+    monkeypatch.setattr(mime_parser, "MIME_MAX_PARTS", 3)
+    payload = _multipart(
+        {"mimeType": "application/pdf", "filename": "a.pdf", "body": {"attachmentId": "1"}},
+        {"mimeType": "application/pdf", "filename": "b.pdf", "body": {"attachmentId": "2"}},
+        _text("text/plain", "never reached"),
+        mime_type="multipart/mixed",
+    )
+    result = parse_payload(payload)
+    assert result["body"] == ""
+    assert [a["filename"] for a in result["attachments"]] == ["a.pdf", "b.pdf"]
+
+
+def test_html_to_text_collapses_whitespace():
+    assert html_to_text("<div>  a \t b </div>\n\n\n<!-- c --><br>d") == "a b\n\nd"
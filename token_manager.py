@@ -0,0 +1,143 @@
+# token_manager.py
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from database import access_tokens_col
+from http_client import get_client
+
+load_dotenv()
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+
+# ----------------------------
+# Config
+# ----------------------------
+# Refresh this many seconds before Google's expiry so a token never dies mid-request
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+# Share access tokens between workers through Mongo (off: each process refreshes its own)
+TOKEN_SHARED_CACHE = os.getenv("TOKEN_SHARED_CACHE", "false").lower() in ("1", "true", "yes")
+
+OTP_SENDER_KEY = "otp-sender"
+
+_tokens: dict = {}      # key → (access_token, expires_at epoch seconds)
+_inflight: dict = {}    # key → refresh task every concurrent caller awaits
+_counters = {"hits": 0, "shared_hits": 0, "refreshes": 0, "merged": 0, "errors": 0}
+
+
+class TokenRefreshError(Exception):
+    pass
+
+
+def gmail_token_key(user_id: str, gmail_email: str) -> str:
+    return f"gmail:{user_id}:{gmail_email}"
+
+
+def _fresh(expires_at: float) -> bool:
+    return expires_at - TOKEN_REFRESH_MARGIN > time.time()
+
+
+async def _shared_lookup(key: str):
+    if not TOKEN_SHARED_CACHE:
+        return None
+    try:
+        doc = await access_tokens_col.find_one({
+            "_id": key,
+            "expires_at": {"$gt": datetime.utcnow() + timedelta(seconds=TOKEN_REFRESH_MARGIN)},
+        })
+    except Exception as e:
+        print(f"❌ Token cache read failed: {e}")
+        return None
+    if not doc:
+        return None
+    expires_in = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+    return doc["access_token"], time.time() + expires_in
+
+
+async def store_token(key: str, access_token: str, expires_in: int):
+    """Remember a token obtained elsewhere (e.g. the OAuth code exchange)."""
+    expires_at = time.time() + int(expires_in)
+    _tokens[key] = (access_token, expires_at)
+    if TOKEN_SHARED_CACHE:
+        try:
+            await access_tokens_col.update_one(
+                {"_id": key},
+                {"$set": {
+                    "access_token": access_token,
+                    "expires_at": datetime.utcnow() + timedelta(seconds=int(expires_in)),
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"❌ Token cache write failed: {e}")
+
+
+async def _refresh(key: str, refresh_token: str) -> str:
+    shared = await _shared_lookup(key)
+    if shared:
+        _counters["shared_hits"] += 1
+        _tokens[key] = shared
+        return shared[0]
+
+    _counters["refreshes"] += 1
+    resp = await get_client("google_oauth").post(
+        GOOGLE_TOKEN_URL,
+        data={
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+            "refresh_token": refresh_token,
+            "grant_type": "refresh_token"
+        }
+    )
+    data = resp.json()
+    access_token = data.get("access_token")
+    if not access_token:
+        _counters["errors"] += 1
+        raise TokenRefreshError(data.get("error_description") or data.get("error") or f"HTTP {resp.status_code}")
+
+    await store_token(key, access_token, data.get("expires_in", 3600))
+    return access_token
+
+
+async def get_access_token(key: str, refresh_token: str) -> str:
+    """
+    Cached access token for `key`, refreshed shortly before it expires.
+    Concurrent callers for the same key share a single refresh request.
+    """
+    cached = _tokens.get(key)
+    if cached and _fresh(cached[1]):
+        _counters["hits"] += 1
+        return cached[0]
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_refresh(key, refresh_token))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        _counters["merged"] += 1
+    # shield: one caller being cancelled must not cancel the refresh the others wait on
+    return await asyncio.shield(task)
+
+
+async def invalidate_token(key: str):
+    """Drop a token Google rejected (401) so the next call refreshes it."""
+    _tokens.pop(key, None)
+    if TOKEN_SHARED_CACHE:
+        try:
+            await access_tokens_col.delete_one({"_id": key})
+        except Exception as e:
+            print(f"❌ Token cache delete failed: {e}")
+
+
+def token_stats() -> dict:
+    return {
+        "cached": len(_tokens),
+        "shared_layer": TOKEN_SHARED_CACHE,
+        "refresh_margin_s": TOKEN_REFRESH_MARGIN,
+        **_counters,
+    }
@@ -0,0 +1,131 @@
+# user_avatars.py
+"""
+Profile pictures, kept out of the user document: resized to a few fixed sizes,
+stored as binary in their own collection and served with ETags.
+
+    python user_avatars.py migrate   # move legacy inline avatar_base64 values here
+"""
+import io
+import os
+import sys
+import base64
+import asyncio
+import hashlib
+from datetime import datetime
+
+from bson import Binary
+from dotenv import load_dotenv
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from database import users_col, user_avatars_col
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+AVATAR_MAX_UPLOAD_BYTES = int(os.getenv("AVATAR_MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", str(40_000_000)))      # decompression bomb guard
+AVATAR_SIZES = tuple(int(s) for s in os.getenv("AVATAR_SIZES", "64,256").split(","))
+AVATAR_QUALITY = int(os.getenv("AVATAR_QUALITY", "85"))
+AVATAR_CACHE_SECONDS = int(os.getenv("AVATAR_CACHE_SECONDS", "86400"))
+AVATAR_CONTENT_TYPE = "image/webp"
+
+Image.MAX_IMAGE_PIXELS = AVATAR_MAX_PIXELS
+
+
+class InvalidAvatar(Exception):
+    pass
+
+
+def _render(data: bytes) -> dict:
+    """Square-crop and encode every configured size. CPU bound: run it off the event loop."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        # Pillow only warns between 1x and 2x MAX_IMAGE_PIXELS: check before decoding
+        if image.size[0] * image.size[1] > AVATAR_MAX_PIXELS:
+            raise InvalidAvatar(f"Avatar larger than {AVATAR_MAX_PIXELS} pixels")
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidAvatar(str(e) or "Unreadable image")
+
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    rendered = {}
+    for size in AVATAR_SIZES:
+        out = io.BytesIO()
+        ImageOps.fit(image, (size, size), Image.LANCZOS).save(out, "WEBP", quality=AVATAR_QUALITY)
+        rendered[str(size)] = out.getvalue()
+    return rendered
+
+
+def avatar_url(user: dict):
+    digest = user.get("avatar_hash")
+    # the hash in the URL busts client caches whenever the picture changes
+    return f"/auth/me/avatar?v={digest}" if digest else None
+
+
+async def save_avatar(user_id, data: bytes) -> str:
+    """Resize, store and point the user at the new avatar. Returns its hash."""
+    if len(data) > AVATAR_MAX_UPLOAD_BYTES:
+        raise InvalidAvatar(f"Avatar larger than {AVATAR_MAX_UPLOAD_BYTES} bytes")
+
+    rendered = await asyncio.to_thread(_render, data)
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    await user_avatars_col.update_one(
+        {"_id": str(user_id)},
+        {"$set": {
+            "hash": digest,
+            "content_type": AVATAR_CONTENT_TYPE,
+            "sizes": {size: Binary(blob) for size, blob in rendered.items()},
+            "updated_at": datetime.utcnow(),
+        }},
+        upsert=True
+    )
+    await users_col.update_one({"_id": user_id}, {"$set": {"avatar_hash": digest}, "$unset": {"avatar_base64": ""}})
+    return digest
+
+
+async def load_avatar(user_id, size: int):
+    """(hash, bytes, size) of the stored size closest to `size`, or None."""
+    nearest = str(min(AVATAR_SIZES, key=lambda s: abs(s - size)))
+    doc = await user_avatars_col.find_one({"_id": str(user_id)}, {"hash": 1, f"sizes.{nearest}": 1})
+    if not doc or nearest not in doc.get("sizes", {}):
+        return None
+    return doc["hash"], bytes(doc["sizes"][nearest]), nearest
+
+
+# ----------------------------
+# Migration
+# ----------------------------
+async def migrate() -> dict:
+    summary = {"migrated": 0, "cleared": 0, "invalid": 0, "inline_bytes": 0}
+    async for user in users_col.find({"avatar_base64": {"$exists": True}}, {"avatar_base64": 1}):
+        encoded = user.get("avatar_base64") or ""
+        summary["inline_bytes"] += len(encoded)
+        if not encoded:
+            await users_col.update_one({"_id": user["_id"]}, {"$unset": {"avatar_base64": ""}})
+            summary["cleared"] += 1
+            continue
+        try:
+            await save_avatar(user["_id"], base64.b64decode(encoded))
+            summary["migrated"] += 1
+        except (InvalidAvatar, ValueError) as e:
+            # left in place for a manual look
+            print(f"❌ Avatar of user {user['_id']} not migrated: {e}")
+            summary["invalid"] += 1
+    return summary
+
+
+async def _main(command: str) -> int:
+    if command == "migrate":
+        print(await migrate())
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "")))
@@ -0,0 +1,215 @@
+# verdict_cache.py
+import os
+import time
+import hashlib
+import unicodedata
+from datetime import datetime
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from database import verdict_cache_col, verdict_cache_state_col
+
+load_dotenv()
+
+# ----------------------------
+# Config
+# ----------------------------
+VERDICT_CACHE_ENABLED = os.getenv("VERDICT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+VERDICT_CACHE_LOCAL_SIZE = int(os.getenv("VERDICT_CACHE_LOCAL_SIZE", "20000"))
+VERDICT_CACHE_LOCAL_TTL = int(os.getenv("VERDICT_CACHE_LOCAL_TTL", "600"))            # seconds
+VERDICT_CACHE_SHARED_TTL = int(os.getenv("VERDICT_CACHE_SHARED_TTL", str(7 * 86400)))  # seconds
+# how often a process re-reads the shared model version / generation
+VERDICT_CACHE_STATE_SECONDS = float(os.getenv("VERDICT_CACHE_STATE_SECONDS", "5"))
+
+# Bump this (or let the ML response report it) whenever the model changes
+_model_version = os.getenv("ML_MODEL_VERSION", "v1")
+# bumped by invalidate_verdicts(); part of every key, like the model version
+_generation = 0
+_STATE_ID = "verdict_cache"
+_state_checked_at = 0.0
+
+_local = TTLCache(maxsize=VERDICT_CACHE_LOCAL_SIZE, ttl=VERDICT_CACHE_LOCAL_TTL)
+_counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+
+# ----------------------------
+# Keys
+# ----------------------------
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivially different copies share a key."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split())
+
+
+def cache_key(text: str, model_version: str = None, generation: int = None) -> str:
+    version = model_version or _model_version
+    generation = _generation if generation is None else generation
+    raw = f"{version}\x00{generation}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def get_model_version() -> str:
+    return _model_version
+
+
+# ----------------------------
+# Shared state: model version + generation, one document for every process
+# ----------------------------
+def _apply_state(version: str, generation: int):
+    global _model_version, _generation
+    if (version, generation) != (_model_version, _generation):
+        print(f"⚠ Verdict cache now at {version}/{generation} (was {_model_version}/{_generation}), local layer reset")
+        _model_version, _generation = version, generation
+        _local.clear()
+
+
+async def _refresh_state():
+    """Pick up version changes / invalidations made by other processes, at most every few seconds."""
+    global _state_checked_at
+    now = time.monotonic()
+    if now - _state_checked_at < VERDICT_CACHE_STATE_SECONDS:
+        return
+    _state_checked_at = now
+    try:
+        state = await verdict_cache_state_col.find_one({"_id": _STATE_ID})
+    except Exception as e:
+        print(f"❌ Verdict cache state read failed: {e}")
+        _counters["errors"] += 1
+        return
+    if state:
+        _apply_state(state.get("model_version") or _model_version, state.get("generation", 0))
+
+
+async def set_model_version(version: str):
+    """Switch every process to a new model version; old keys become unreachable."""
+    if not version or version == _model_version:
+        return
+    state = await verdict_cache_state_col.find_one_and_update(
+        {"_id": _STATE_ID},
+        {"$set": {"model_version": version, "updated_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    _apply_state(version, state.get("generation", 0))
+
+
+# ----------------------------
+# Lookup / store
+# ----------------------------
+async def get_cached_verdict(text: str):
+    if not VERDICT_CACHE_ENABLED:
+        return None
+
+    await _refresh_state()
+    key = cache_key(text)
+    hit = _local.get(key)
+    if hit is not None:
+        _counters["local_hits"] += 1
+        return dict(hit)
+
+    try:
+        doc = await verdict_cache_col.find_one({"_id": key})
+    except Exception as e:
+        print(f"❌ Verdict cache read failed: {e}")
+        _counters["errors"] += 1
+        doc = None
+
+    if doc:
+        _counters["shared_hits"] += 1
+        _local[key] = doc["result"]
+        return dict(doc["result"])
+
+    _counters["misses"] += 1
+    return None
+
+
+async def get_cached_verdicts(texts: list) -> list:
+    """get_cached_verdict for a whole list: local layer first, then one $in lookup for the rest."""
+    if not VERDICT_CACHE_ENABLED:
+        return [None] * len(texts)
+
+    await _refresh_state()
+    keys = [cache_key(text) for text in texts]
+    results = [None] * len(texts)
+    wanted = {}
+    for i, key in enumerate(keys):
+        hit = _local.get(key)
+        if hit is not None:
+            _counters["local_hits"] += 1
+            results[i] = dict(hit)
+        else:
+            wanted.setdefault(key, []).append(i)
+
+    if wanted:
+        try:
+            docs = await verdict_cache_col.find({"_id": {"$in": list(wanted)}}).to_list(None)
+        except Exception as e:
+            print(f"❌ Verdict cache read failed: {e}")
+            _counters["errors"] += 1
+            docs = []
+        for doc in docs:
+            _local[doc["_id"]] = doc["result"]
+            for i in wanted.pop(doc["_id"]):
+                _counters["shared_hits"] += 1
+                results[i] = dict(doc["result"])
+        _counters["misses"] += sum(len(indexes) for indexes in wanted.values())
+
+    return results
+
+
+async def store_verdict(text: str, result: dict):
+    if not VERDICT_CACHE_ENABLED:
+        return
+
+    key = cache_key(text)
+    _local[key] = dict(result)
+    try:
+        await verdict_cache_col.update_one(
+            {"_id": key},
+            {"$set": {
+                "result": result,
+                "model_version": _model_version,
+                "created_at": datetime.utcnow(),
+            }},
+            upsert=True
+        )
+        _counters["stores"] += 1
+    except Exception as e:
+        print(f"❌ Verdict cache write failed: {e}")
+        _counters["errors"] += 1
+
+
+async def invalidate_verdicts(model_version: str = None) -> int:
+    """
+    Drop cached verdicts. With no version, everything goes (use after an in-place retrain);
+    otherwise only entries for that model version are removed. Invalidating the current
+    version bumps the shared generation, so other processes stop serving their local
+    copies within VERDICT_CACHE_STATE_SECONDS.
+    """
+    if not model_version or model_version == _model_version:
+        state = await verdict_cache_state_col.find_one_and_update(
+            {"_id": _STATE_ID},
+            {"$inc": {"generation": 1},
+             "$set": {"updated_at": datetime.utcnow()},
+             "$setOnInsert": {"model_version": _model_version}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        _apply_state(state["model_version"], state["generation"])
+    query = {"model_version": model_version} if model_version else {}
+    result = await verdict_cache_col.delete_many(query)
+    return result.deleted_count
+
+
+def verdict_cache_stats() -> dict:
+    lookups = _counters["local_hits"] + _counters["shared_hits"] + _counters["misses"]
+    hits = _counters["local_hits"] + _counters["shared_hits"]
+    return {
+        **_counters,
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        "local_size": len(_local),
+        "model_version": _model_version,
+        "generation": _generation,
+        "enabled": VERDICT_CACHE_ENABLED,
+    }